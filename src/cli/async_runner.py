@@ -0,0 +1,38 @@
+"""
+CLIから非同期処理を実行するためのランナー
+"""
+import asyncio
+from typing import Any, Coroutine, TypeVar
+
+try:
+    # libuvベースのイベントループ（サブプロセス起動やタスク切り替えが高速）
+    import uvloop
+except ImportError:
+    uvloop = None
+
+T = TypeVar("T")
+
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    """イベントループを作成（uvloop・eager task factoryが使えれば使用）"""
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+    if hasattr(asyncio, "eager_task_factory"):  # Python 3.12+
+        # 最初のawaitまで同期的に実行し、スケジューラの往復を省く
+        loop.set_task_factory(asyncio.eager_task_factory)
+    return loop
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """コルーチンを新しいイベントループで実行（asyncio.runの置き換え）"""
+    if hasattr(asyncio, "Runner"):  # Python 3.11+
+        with asyncio.Runner(loop_factory=_new_event_loop) as runner:
+            return runner.run(coro)
+            
+    loop = _new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
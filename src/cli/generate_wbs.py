@@ -1,13 +1,13 @@
 """
 WBS生成用のCLIコマンド
 """
-import asyncio
+import itertools
 import logging
 from pathlib import Path
 import typer
 from typing import Optional
 
-from src.core.wbs_generator import WBSGenerator
+# WBSGeneratorは読み込みが重いため、main内で必要になった時点でimportする
 
 # ロギング設定
 logging.basicConfig(
@@ -39,6 +39,8 @@ def main(
     )
 ):
     """要求文からWBSを生成"""
+    from src.core.wbs_generator import WBSGenerator
+    from src.cli.async_runner import run_async
     
     # デフォルトの出力先
     if output is None:
@@ -49,7 +51,7 @@ def main(
         generator = WBSGenerator(workspace_dir=str(workspace))
         
         # 非同期関数を実行
-        result_path = asyncio.run(generator.generate(requirement, output))
+        result_path = run_async(generator.generate(requirement, output))
         
         typer.echo(f"✨ WBS generated successfully: {result_path}")
         
@@ -57,10 +59,9 @@ def main(
         if result_path.exists():
             typer.echo("\n--- Preview ---")
             with open(result_path, 'r') as f:
-                lines = f.readlines()[:20]  # 最初の20行
-                for line in lines:
+                for line in itertools.islice(f, 20):  # 最初の20行
                     typer.echo(line.rstrip())
-                if len(f.readlines()) > 20:
+                if f.readline():
                     typer.echo("... (truncated)")
         
         # クリーンアップ
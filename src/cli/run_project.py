@@ -2,23 +2,23 @@
 """
 プロジェクト実行用CLIスクリプト
 """
-import asyncio
+import functools
 import logging
 import sys
 from pathlib import Path
-from datetime import datetime
 import typer
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
-from rich.table import Table
-from rich.panel import Panel
-from rich import print as rprint
 
-from src.core import Orchestrator
+# rich・Orchestratorは読み込みが重いため、各コマンド内で必要になった時点でimportする
 
 
 app = typer.Typer()
-console = Console()
+
+
+@functools.lru_cache(maxsize=None)
+def get_console():
+    """表示用のConsoleを取得（初回呼び出し時に生成）"""
+    from rich.console import Console
+    return Console()
 
 
 def setup_logging(verbose: bool = False):
@@ -34,33 +34,46 @@ def setup_logging(verbose: bool = False):
     )
 
 
-def create_progress_callback(progress: Progress, task_id):
+def create_progress_callback(progress, task_id):
     """進捗表示用のコールバックを作成"""
+    console = get_console()
     task_status = {}
     
-    def callback(update):
-        update_type = update["type"]
+    def on_project_started(update):
+        summary = update["summary"]
+        progress.update(task_id, total=summary["total"])
         
-        if update_type == "project_started":
-            summary = update["summary"]
-            progress.update(task_id, total=summary["total"])
-            
-        elif update_type == "task_started":
-            task_status[update["task_id"]] = "🔄 実行中"
-            console.print(f"[yellow]▶ タスク開始:[/yellow] {update['task_name']}")
-            
-        elif update_type == "task_completed":
-            task_status[update["task_id"]] = "✅ 完了"
-            console.print(f"[green]✓ タスク完了:[/green] {update['task_id']}")
-            
-        elif update_type == "task_failed":
-            task_status[update["task_id"]] = "❌ 失敗"
-            console.print(f"[red]✗ タスク失敗:[/red] {update['task_id']} - {update['error']}")
-            
-        elif update_type == "progress_update":
-            summary = update["summary"]
-            completed = summary["completed"] + summary["failed"]
-            progress.update(task_id, completed=completed)
+    def on_task_started(update):
+        task_status[update["task_id"]] = "🔄 実行中"
+        console.print(f"[yellow]▶ タスク開始:[/yellow] {update['task_name']}")
+        
+    def on_task_completed(update):
+        task_status[update["task_id"]] = "✅ 完了"
+        console.print(f"[green]✓ タスク完了:[/green] {update['task_id']}")
+        
+    def on_task_failed(update):
+        task_status[update["task_id"]] = "❌ 失敗"
+        console.print(f"[red]✗ タスク失敗:[/red] {update['task_id']} - {update['error']}")
+        
+    def on_progress_update(update):
+        summary = update["summary"]
+        completed = summary["completed"] + summary["failed"]
+        progress.update(task_id, completed=completed)
+        
+    def on_unknown(update):
+        pass
+    
+    # イベント種別 -> ハンドラ
+    handlers = {
+        "project_started": on_project_started,
+        "task_started": on_task_started,
+        "task_completed": on_task_completed,
+        "task_failed": on_task_failed,
+        "progress_update": on_progress_update,
+    }
+    
+    def callback(update):
+        handlers.get(update["type"], on_unknown)(update)
             
     return callback
 
@@ -75,7 +88,14 @@ def run(
     verbose: bool = typer.Option(False, "-v", "--verbose", help="詳細ログを表示"),
 ):
     """プロジェクトを実行する"""
+    from rich.panel import Panel
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+    
+    from src.core import Orchestrator
+    from src.cli.async_runner import run_async
+    
     setup_logging(verbose)
+    console = get_console()
     
     # ヘッダー表示
     console.print(Panel.fit(
@@ -108,7 +128,7 @@ def run(
         
         # 実行
         try:
-            results = asyncio.run(orchestrator.run())
+            results = run_async(orchestrator.run())
             
             # 結果のサマリーを表示
             display_results(results, orchestrator.get_status_report())
@@ -120,6 +140,9 @@ def run(
 
 def display_results(results, status_report):
     """実行結果を表示"""
+    from rich.table import Table
+    
+    console = get_console()
     console.print("\n")
     
     # サマリーテーブル
@@ -161,6 +184,8 @@ def status(
     workspace: Path = typer.Option("./workspace", help="作業ディレクトリ"),
 ):
     """プロジェクトの状態を確認する"""
+    from src.core import Orchestrator
+    
     orchestrator = Orchestrator(
         wbs_path=str(wbs_path),
         workspace_dir=str(workspace),
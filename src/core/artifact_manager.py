@@ -3,20 +3,165 @@
 タスクの実行結果として生成されたファイルを追跡・管理する
 共有コンテキスト機能をサポート
 """
+import asyncio
+import atexit
+import contextlib
 import json
 import hashlib
+import itertools
+import mmap
+import os
 import shutil
-from dataclasses import dataclass, field, asdict
+import sys
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 import logging
 
+from .serialization import dumps as _dumps, loads as _loads
+
 if TYPE_CHECKING:
     from .conflict_resolver import ConflictResolver
 
+try:
+    # reflink(FICLONE)用（Windowsにはない）
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# macOS(APFS)のclonefile(2)。Linuxのreflinkに相当する
+_clonefile = None
+if sys.platform == "darwin":
+    try:
+        import ctypes
+        _clonefile = ctypes.CDLL(None, use_errno=True).clonefile
+        _clonefile.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int)
+        _clonefile.restype = ctypes.c_int
+    except (ImportError, OSError, AttributeError):
+        _clonefile = None
+
+try:
+    # XXH3は暗号学的ハッシュではないが、メモリ帯域に近い速度で内容の同一性を判定できる
+    from xxhash import xxh3_64 as _hash_factory
+except ImportError:
+    try:
+        # BLAKE3はSIMDで高速なため、インストールされていれば次点で使用
+        from blake3 import blake3 as _hash_factory
+    except ImportError:
+        _hash_factory = hashlib.sha256
+
 logger = logging.getLogger(__name__)
 
+# ハッシュ計算時の読み込みバッファサイズ
+HASH_CHUNK_SIZE = 256 * 1024
+
+# スレッドプールで並列処理する際に1回で渡す件数の上限
+PARALLEL_MAP_MAX_CHUNK = 64
+
+# このサイズ以上のファイルはmmapしてハッシュを計算する
+MMAP_HASH_THRESHOLD = 10 * 1024 * 1024
+
+# 走査時に除外するディレクトリ/ファイル名
+DEFAULT_EXCLUDES = frozenset({'.git', '__pycache__', '.claude'})
+
+# Linuxのreflink(FICLONE) ioctl番号
+FICLONE = 0x40049409
+
+# ジャーナルのエントリ数がこの値に達したらレジストリ本体へコンパクションする
+JOURNAL_COMPACTION_THRESHOLD = 50
+
+# コンパクションの最小間隔（秒）。短時間に登録が集中しても全体書き出しは間引く
+COMPACTION_MIN_INTERVAL = 1.0
+
+# mtimeがこの時間内のファイルは同一タイムスタンプでの再書き込みがあり得るためキャッシュしない
+RACY_MTIME_WINDOW_NS = 2_000_000_000
+
+
+def _flush_registry_at_exit(manager_ref: "weakref.ref[ArtifactManager]"):
+    """終了時にジャーナルをレジストリ本体へ統合する"""
+    manager = manager_ref()
+    # ワークスペースごと削除済みの場合は何もしない
+    if manager is not None and manager._journal_entries and manager._journal_path.exists():
+        manager.compact()
+
+
+def clone_file(src: str, dst: str) -> str:
+    """ファイルをreflink(copy-on-write)でクローンし、使えなければカーネル内コピーする
+    
+    shutil.copytreeのcopy_functionとして使用できる。
+    reflinkはメタデータ操作のみで完了し、書き込み時に初めて実データがコピーされる。
+    ハードリンクと違い、タスク側の書き込みが共有ワークスペースに漏れることはない。
+    macOSではclonefile(2)を使う（既存のファイルは上書きできないため一時名で作成して置き換える）。
+    reflinkが使えない場合はos.copy_file_rangeでユーザー空間を経由せずにコピーし、
+    それも使えなければshutil.copy2にフォールバックする。
+    """
+    if _clonefile is not None:
+        tmp_dst = f"{dst}.{os.getpid()}.clone"
+        if _clonefile(os.fsencode(src), os.fsencode(tmp_dst), 0) == 0:
+            try:
+                os.replace(tmp_dst, dst)
+                return dst
+            except OSError:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_dst)
+    
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                if fcntl is None:
+                    raise OSError("fcntl is not available")
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                # reflink非対応のプラットフォーム/ファイルシステム
+                if not hasattr(os, "copy_file_range"):
+                    raise
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+        shutil.copystat(src, dst)
+        return dst
+    except OSError:
+        return shutil.copy2(src, dst)
+
+
+def setup_claude_settings(task_workspace: Path):
+    """作業ディレクトリにClaude Codeの設定（.claudeディレクトリ）を用意する
+    
+    プロジェクト直下に.claudeディレクトリがあればコピーし、なければWriteツールを許可する
+    settings.jsonを作成する。
+    """
+    # プロジェクト直下の.claudeディレクトリがあればコピー
+    project_claude_dir = Path.cwd() / ".claude"
+    if project_claude_dir.exists():
+        task_claude_dir = task_workspace / ".claude"
+        if task_claude_dir.exists():
+            shutil.rmtree(task_claude_dir)
+        shutil.copytree(project_claude_dir, task_claude_dir)
+        logger.info(f"Copied .claude directory from project root to {task_workspace}")
+    else:
+        # .claude/settings.jsonを作成してWriteツールを許可
+        claude_dir = task_workspace / ".claude"
+        claude_dir.mkdir(exist_ok=True)
+        
+        settings_content = {
+            "permissions": {
+                "allow": [
+                    "Write"
+                ]
+            }
+        }
+        
+        settings_file = claude_dir / "settings.json"
+        settings_file.write_text(json.dumps(settings_content, indent=2))
+        logger.info(f"Created {settings_file} with Write permission")
+
 
 @dataclass
 class Artifact:
@@ -35,6 +180,8 @@ class FileMetadata:
     hash: str
     size: int
     mtime: float
+    # mtimeが十分古い時点でハッシュしたか（Trueなら(size, mtime)一致で内容も同一とみなせる）
+    stable: bool = False
 
 
 @dataclass
@@ -58,59 +205,104 @@ class ArtifactManager:
     
     def __init__(self, storage_path: Optional[Path] = None, workspace_dir: Optional[Path] = None):
         self.registry: Dict[str, TaskArtifacts] = {}
-        self.file_index: Dict[str, List[str]] = {}  # filename -> [task_ids]
+        self.file_index: Dict[str, Set[str]] = {}  # filename -> {task_ids}
+        self._conflicts_cache: Optional[Dict[str, List[str]]] = None  # file_index更新時に破棄
         self.storage_path = storage_path
         self.workspace_dir = workspace_dir or Path("workspace")
         self.shared_workspace = self.workspace_dir / "shared"
         self.task_snapshots: Dict[str, Dict[str, FileMetadata]] = {}  # task_id -> snapshot
+        # 直近の統合後の共有ワークスペースのスナップショット（次回の走査とタスク用コピーで再利用）
+        self._shared_snapshot: Dict[str, FileMetadata] = {}
         self.base_snapshots_dir = self.workspace_dir / "base_snapshots"  # ベースファイル保存用ディレクトリ
+        self._hash_cache: Dict[Tuple[str, int, int], str] = {}  # (path, size, mtime_ns) -> hash
+        # 登録ごとの差分を追記するジャーナル（レジストリ本体の全体書き換えを避ける）
+        self._journal_path = storage_path.with_suffix(".jsonl") if storage_path else None
+        self._journal_entries = 0
+        self._last_compaction = float("-inf")
+        
+        if storage_path:
+            atexit.register(_flush_registry_at_exit, weakref.ref(self))
         
-        if storage_path and storage_path.exists():
+        if storage_path and (storage_path.exists() or self._journal_path.exists()):
             self._load_registry()
     
     def register_task_artifacts(self, task_id: str, task_name: str, 
                               task_dir: Path, exclude_patterns: List[str] = None) -> TaskArtifacts:
         """タスクの成果物を登録"""
-        if exclude_patterns is None:
-            exclude_patterns = ['.claude', '__pycache__', '.git']
+        return self.register_task_artifacts_batch([(task_id, task_name, task_dir)], exclude_patterns)[0]
+    
+    def register_task_artifacts_batch(self, tasks: List[Tuple[str, str, Path]],
+                                      exclude_patterns: List[str] = None) -> List[TaskArtifacts]:
+        """複数タスクの成果物をまとめて登録
+        
+        各タスクディレクトリの走査と全ファイルのハッシュ計算をスレッドプールで並列に行い、
+        レジストリとファイルインデックスへの反映は指定順に行う。
+        
+        Args:
+            tasks: (タスクID, タスク名, タスクディレクトリ) のリスト
+            exclude_patterns: 除外するディレクトリ/ファイル名
             
-        task_artifacts = TaskArtifacts(
-            task_id=task_id,
-            task_name=task_name,
-            completed_at=datetime.now().isoformat()
-        )
+        Returns:
+            tasksと同じ順のTaskArtifactsのリスト
+        """
+        excludes = DEFAULT_EXCLUDES if exclude_patterns is None else frozenset(exclude_patterns)
         
         # ディレクトリ内の全ファイルを走査
-        for file_path in task_dir.rglob("*"):
-            if file_path.is_file():
-                # 除外パターンチェック
-                if any(pattern in str(file_path) for pattern in exclude_patterns):
-                    continue
-                    
-                relative_path = file_path.relative_to(task_dir)
-                
+        listings = self._parallel_map(
+            lambda spec: list(self._iter_files(spec[2], excludes)), tasks
+        )
+        
+        # ハッシュ計算は全タスク分をまとめてスレッドプールで並列実行
+        hashed = iter(self._hash_files([(path, stat) for files in listings for _, path, stat in files]))
+        
+        registered = []
+        for (task_id, task_name, task_dir), files in zip(tasks, listings):
+            task_id = sys.intern(task_id)
+            task_artifacts = TaskArtifacts(
+                task_id=task_id,
+                task_name=task_name,
+                completed_at=datetime.now().isoformat()
+            )
+            
+            # 再登録の場合は前回の登録分をインデックスから外す
+            self._unindex_task(task_id)
+            
+            for (rel_path, _, _), (_, file_hash, size, mtime) in zip(files, itertools.islice(hashed, len(files))):
                 artifact = Artifact(
-                    filename=file_path.name,
-                    path=str(relative_path),
-                    size=file_path.stat().st_size,
-                    hash=self._calculate_hash(file_path),
-                    created_at=datetime.fromtimestamp(file_path.stat().st_mtime).isoformat(),
+                    filename=sys.intern(os.path.basename(rel_path)),
+                    path=rel_path,
+                    size=size,
+                    hash=file_hash,
+                    created_at=datetime.fromtimestamp(mtime).isoformat(),
                     task_id=task_id
                 )
                 
                 task_artifacts.add_artifact(artifact)
                 
                 # ファイルインデックスを更新
-                if artifact.filename not in self.file_index:
-                    self.file_index[artifact.filename] = []
-                self.file_index[artifact.filename].append(task_id)
+                self.file_index.setdefault(artifact.filename, set()).add(task_id)
                 
                 logger.info(f"Registered artifact: {artifact.filename} from task {task_id}")
+            
+            self.registry[task_id] = task_artifacts
+            self._save_registry(task_artifacts)
+            registered.append(task_artifacts)
         
-        self.registry[task_id] = task_artifacts
-        self._save_registry()
-        
-        return task_artifacts
+        self._conflicts_cache = None
+        return registered
+    
+    def _unindex_task(self, task_id: str):
+        """登録済みのタスクの成果物をファイルインデックスから外す"""
+        previous = self.registry.get(task_id)
+        if previous is None:
+            return
+        for artifact in previous.artifacts:
+            task_ids = self.file_index.get(artifact.filename)
+            if task_ids is None:
+                continue
+            task_ids.discard(task_id)
+            if not task_ids:
+                del self.file_index[artifact.filename]
     
     def get_task_artifacts(self, task_id: str) -> Optional[TaskArtifacts]:
         """特定タスクの成果物を取得"""
@@ -118,15 +310,20 @@ class ArtifactManager:
     
     def get_tasks_by_file(self, filename: str) -> List[str]:
         """特定のファイル名を生成したタスクのリストを取得"""
-        return self.file_index.get(filename, [])
+        return sorted(self.file_index.get(filename, ()))
     
     def detect_file_conflicts(self) -> Dict[str, List[str]]:
-        """同じファイル名を生成した複数のタスクを検出"""
-        conflicts = {}
-        for filename, task_ids in self.file_index.items():
-            if len(task_ids) > 1:
-                conflicts[filename] = task_ids
-        return conflicts
+        """同じファイル名を生成した複数のタスクを検出
+        
+        登録が変わらない間は前回の結果を再利用する（呼び出し側の変更が及ばないようコピーを返す）
+        """
+        if self._conflicts_cache is None:
+            self._conflicts_cache = {
+                filename: sorted(task_ids)
+                for filename, task_ids in self.file_index.items()
+                if len(task_ids) > 1
+            }
+        return {filename: list(task_ids) for filename, task_ids in self._conflicts_cache.items()}
     
     def get_artifact_by_name(self, filename: str, task_id: Optional[str] = None) -> List[Artifact]:
         """ファイル名で成果物を検索"""
@@ -155,61 +352,256 @@ class ArtifactManager:
         return dependencies_artifacts
     
     def _calculate_hash(self, file_path: Path) -> str:
-        """ファイルのハッシュ値を計算"""
-        sha256_hash = hashlib.sha256()
+        """ファイルのハッシュ値を計算
+        
+        ハッシュは内容の同一性判定にのみ使用するため、
+        xxHash（XXH3）やBLAKE3が利用可能であればSHA-256より高速なそれらを使う
+        """
         with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()[:16]  # 短縮版
+            if os.fstat(f.fileno()).st_size >= MMAP_HASH_THRESHOLD:
+                # 大きなファイルはページキャッシュをそのままマップし、ユーザー空間へのコピーを省く
+                file_hash = _hash_factory()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    file_hash.update(mm)
+            elif hasattr(hashlib, "file_digest"):  # Python 3.11+
+                file_hash = hashlib.file_digest(f, _hash_factory)
+            else:
+                file_hash = _hash_factory()
+                for byte_block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    file_hash.update(byte_block)
+        return file_hash.hexdigest()[:16]  # 短縮版
+    
+    @staticmethod
+    def _iter_files(root: Path,
+                    excludes: FrozenSet[str] = DEFAULT_EXCLUDES) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """os.scandirでディレクトリを再帰的に走査し、ファイルとstat情報を返す
+        
+        除外対象のディレクトリは中に潜らずに枝刈りする。
+        パスは文字列のまま返し、相対パスも文字列のスライスで求める
+        （ファイルごとにPathオブジェクトを作らない）。
+        
+        Args:
+            root: 走査するディレクトリ
+            excludes: 除外するディレクトリ/ファイル名
+            
+        Yields:
+            (rootからの相対パス, ファイルパス, statの結果)
+        """
+        root_str = str(root)
+        prefix_len = len(root_str) + 1
+        stack = [root_str]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.name in excludes:
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path[prefix_len:], entry.path, entry.stat()
+            except FileNotFoundError:
+                continue
+    
+    def _hash_file_stat(self, item: Tuple[str, os.stat_result]) -> Tuple[str, str, int, float]:
+        """ファイルのハッシュ値とstat情報を取得
+        
+        Args:
+            item: (パス, statの結果)
+        
+        Returns:
+            (パス, ハッシュ値, サイズ, 更新時刻)
+        """
+        file_path, stat = item
+        return file_path, self._cached_hash(file_path, stat), stat.st_size, stat.st_mtime
+    
+    def _cached_hash(self, file_path: Union[str, Path], stat: Optional[os.stat_result] = None) -> str:
+        """キャッシュ付きでファイルのハッシュ値を取得
+        
+        (パス, サイズ, mtime_ns) が変わっていなければ前回のハッシュ値を再利用する。
+        スナップショット作成と成果物登録で同じファイルを何度もハッシュしないため。
+        """
+        if stat is None:
+            stat = os.stat(file_path)
+        key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+        file_hash = self._hash_cache.get(key)
+        if file_hash is None:
+            file_hash = self._calculate_hash(file_path)
+            # 直近に更新されたファイルは同じmtimeのまま内容が変わる可能性があるためキャッシュしない
+            if time.time_ns() - stat.st_mtime_ns > RACY_MTIME_WINDOW_NS:
+                self._hash_cache[key] = file_hash
+        return file_hash
+    
+    def _seed_hash_cache(self, file_path: Path, metadata: FileMetadata):
+        """コピー直後のファイルにコピー元の既知のハッシュ値を登録する
+        
+        copy2/clone_fileはmtimeを保持するため、サイズとmtimeがコピー元のメタデータと
+        一致していれば内容も同一とみなせる。次回のスナップショットで再ハッシュせずに済む。
+        """
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return
+        if (stat.st_size == metadata.size and stat.st_mtime == metadata.mtime
+                and time.time_ns() - stat.st_mtime_ns > RACY_MTIME_WINDOW_NS):
+            self._hash_cache[(str(file_path), stat.st_size, stat.st_mtime_ns)] = metadata.hash
+    
+    def _hash_files(self, files: List[Tuple[str, os.stat_result]]) -> List[Tuple[str, str, int, float]]:
+        """複数ファイルのハッシュ値をスレッドプールで並列計算"""
+        return self._parallel_map(self._hash_file_stat, files)
+    
+    @staticmethod
+    def _parallel_map(func, items: List) -> List:
+        """itemsにfuncをスレッドプールで並列適用
+        
+        hashlibはupdate中にGILを解放するため、読み込みとハッシュ計算が並列に進む
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+            
+        workers = min(len(items), os.cpu_count() or 1)
+        # 小さいファイルが大量にある場合は1件ごとのスレッド間受け渡しが支配的になるため、
+        # 各ワーカーに数チャンクずつ行き渡る範囲でまとめて渡す
+        chunk_size = max(1, min(PARALLEL_MAP_MAX_CHUNK, len(items) // (workers * 4)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if chunk_size == 1:
+                return list(executor.map(func, items))
+            chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+            return [
+                result
+                for chunk_results in executor.map(lambda chunk: [func(item) for item in chunk], chunks)
+                for result in chunk_results
+            ]
+    
+    @staticmethod
+    def _task_artifacts_to_dict(ta: TaskArtifacts) -> Dict:
+        """TaskArtifactsをシリアライズ用の辞書に変換"""
+        return {
+            "task_id": ta.task_id,
+            "task_name": ta.task_name,
+            "completed_at": ta.completed_at,
+            # Artifactはプリミティブ型のフィールドのみなので、asdictでコピーせず__dict__を直接使う
+            "artifacts": [vars(a) for a in ta.artifacts]
+        }
     
-    def _save_registry(self):
-        """レジストリをファイルに保存"""
+    @staticmethod
+    def _task_artifacts_from_dict(task_data: Dict) -> TaskArtifacts:
+        """辞書からTaskArtifactsを復元"""
+        # JSONから読み込んだ文字列は出現ごとに別オブジェクトになるため、
+        # 成果物ごとに繰り返すタスクIDとファイル名はinternして共有する
+        task_id = sys.intern(task_data["task_id"])
+        task_artifacts = TaskArtifacts(
+            task_id=task_id,
+            task_name=task_data["task_name"],
+            completed_at=task_data["completed_at"]
+        )
+        
+        for artifact_data in task_data["artifacts"]:
+            artifact = Artifact(**artifact_data)
+            artifact.task_id = task_id
+            artifact.filename = sys.intern(artifact.filename)
+            task_artifacts.add_artifact(artifact)
+            
+        return task_artifacts
+    
+    def _save_registry(self, task_artifacts: Optional[TaskArtifacts] = None):
+        """レジストリをファイルに保存
+        
+        レジストリ本体が既にあれば、今回登録したタスク分だけをジャーナルに追記する。
+        ジャーナルが一定数たまったらcompact()でレジストリ本体に統合する
+        （ただしCOMPACTION_MIN_INTERVAL秒に1回まで）。
+        
+        Args:
+            task_artifacts: 今回登録したタスクの成果物（Noneの場合は全体を書き出す）
+        """
+        if not self.storage_path:
+            return
+            
+        if task_artifacts is None or not self.storage_path.exists():
+            self.compact()
+            return
+            
+        with open(self._journal_path, 'ab') as f:
+            f.write(_dumps(self._task_artifacts_to_dict(task_artifacts)) + b"\n")
+        self._journal_entries += 1
+            
+        logger.debug(f"Registry journal appended: {self._journal_path}")
+        
+        if (self._journal_entries >= JOURNAL_COMPACTION_THRESHOLD
+                and time.monotonic() - self._last_compaction >= COMPACTION_MIN_INTERVAL):
+            self.compact()
+    
+    def compact(self):
+        """レジストリ全体を書き出し、ジャーナルを空にする
+        
+        一時ファイルに書いてからos.replaceで置き換えるため、途中でクラッシュしても
+        レジストリ本体が壊れることはない
+        """
         if not self.storage_path:
             return
             
         data = {
             "registry": {
-                task_id: {
-                    "task_id": ta.task_id,
-                    "task_name": ta.task_name,
-                    "completed_at": ta.completed_at,
-                    "artifacts": [asdict(a) for a in ta.artifacts]
-                }
+                task_id: self._task_artifacts_to_dict(ta)
                 for task_id, ta in self.registry.items()
             },
-            "file_index": self.file_index
+            "file_index": {
+                filename: sorted(task_ids)
+                for filename, task_ids in self.file_index.items()
+            }
         }
         
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.storage_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        tmp_path = self.storage_path.with_suffix(self.storage_path.suffix + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(_dumps(data, indent=True))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_path)
+        
+        # 本体に統合済みなのでジャーナルは不要
+        if self._journal_path.exists():
+            self._journal_path.unlink()
+        self._journal_entries = 0
+        self._last_compaction = time.monotonic()
             
         logger.debug(f"Registry saved to {self.storage_path}")
     
     def _load_registry(self):
-        """レジストリをファイルから読み込み"""
-        if not self.storage_path or not self.storage_path.exists():
+        """レジストリをファイルから読み込み（ジャーナルがあれば再適用）"""
+        if not self.storage_path:
             return
             
-        with open(self.storage_path, 'r') as f:
-            data = json.load(f)
-            
-        # レジストリを復元
-        for task_id, task_data in data.get("registry", {}).items():
-            task_artifacts = TaskArtifacts(
-                task_id=task_data["task_id"],
-                task_name=task_data["task_name"],
-                completed_at=task_data["completed_at"]
-            )
-            
-            for artifact_data in task_data["artifacts"]:
-                artifact = Artifact(**artifact_data)
-                task_artifacts.add_artifact(artifact)
+        if self.storage_path.exists():
+            data = _loads(self.storage_path.read_bytes())
                 
-            self.registry[task_id] = task_artifacts
-            
-        self.file_index = data.get("file_index", {})
+            # レジストリを復元
+            for task_id, task_data in data.get("registry", {}).items():
+                self.registry[task_id] = self._task_artifacts_from_dict(task_data)
+                
+            self.file_index = {
+                sys.intern(filename): {sys.intern(task_id) for task_id in task_ids}
+                for filename, task_ids in data.get("file_index", {}).items()
+            }
         
+        if self._journal_path.exists():
+            with open(self._journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        task_data = _loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中でクラッシュした末尾行は無視
+                        logger.warning(f"Skipping corrupted journal entry in {self._journal_path}")
+                        continue
+                        
+                    task_artifacts = self._task_artifacts_from_dict(task_data)
+                    self._unindex_task(task_artifacts.task_id)
+                    self.registry[task_artifacts.task_id] = task_artifacts
+                    for artifact in task_artifacts.artifacts:
+                        self.file_index.setdefault(artifact.filename, set()).add(task_artifacts.task_id)
+                    self._journal_entries += 1
+        
+        self._conflicts_cache = None
         logger.info(f"Registry loaded from {self.storage_path}")
     
     def get_summary(self) -> Dict:
@@ -244,8 +636,6 @@ class ArtifactManager:
         Returns:
             実際に保存されたパス
         """
-        import shutil
-        
         dest_dir.mkdir(parents=True, exist_ok=True)
         original_dest = dest_dir / source_path.name
         
@@ -262,7 +652,7 @@ class ArtifactManager:
                 
                 if resolution.strategy == "merged" and resolution.merged_file_path:
                     # マージ成功 - マージ結果で上書き
-                    shutil.copy2(resolution.merged_file_path, original_dest)
+                    clone_file(str(resolution.merged_file_path), str(original_dest))
                     logger.info(
                         f"Successfully merged {source_path.name}: {resolution.message}"
                     )
@@ -285,44 +675,81 @@ class ArtifactManager:
             dest_path = original_dest
         
         # ファイルをコピー
-        shutil.copy2(source_path, dest_path)
+        clone_file(str(source_path), str(dest_path))
         logger.info(f"Integrated: {source_path.name} -> {dest_path.name}")
         
         return dest_path
     
-    def _create_snapshot(self, directory: Path) -> Dict[str, FileMetadata]:
+    def _create_snapshot(self, directory: Path,
+                         prev: Optional[Dict[str, FileMetadata]] = None) -> Dict[str, FileMetadata]:
         """ディレクトリのスナップショットを作成
         
         Args:
             directory: スナップショットを作成するディレクトリ
+            prev: 同じディレクトリの以前のスナップショット
+                  （サイズとmtimeが変わっていないファイルはハッシュを再計算しない）
             
         Returns:
             ファイルパス -> メタデータのマッピング
         """
-        snapshot = {}
+        return self._create_snapshots([directory], [prev])[0]
+    
+    def _create_snapshots(
+        self,
+        directories: List[Path],
+        prevs: Optional[List[Optional[Dict[str, FileMetadata]]]] = None
+    ) -> List[Dict[str, FileMetadata]]:
+        """複数ディレクトリのスナップショットを1回の並列パスでまとめて作成
+        
+        全ディレクトリのファイルを1つのスレッドプールで処理するため、
+        ディレクトリごとに作成するよりハッシュ計算の並列度が上がる。
+        
+        Args:
+            directories: スナップショットを作成するディレクトリのリスト
+            prevs: 各ディレクトリの以前のスナップショット（_create_snapshotを参照）
+            
+        Returns:
+            directoriesと同じ順序のスナップショットのリスト
+        """
+        snapshots: List[Dict[str, FileMetadata]] = [{} for _ in directories]
+        if prevs is None:
+            prevs = [None] * len(directories)
+        
+        files = [
+            (index, item)
+            for index, directory in enumerate(directories)
+            if directory.exists()
+            for item in self._iter_files(directory)
+        ]
         
-        if not directory.exists():
-            return snapshot
+        def snapshot_file(indexed_item: Tuple[int, Tuple[str, str, os.stat_result]]):
+            index, (rel_path, file_path, stat) = indexed_item
             
-        for file_path in directory.rglob("*"):
-            if file_path.is_file():
-                # 除外パターン
-                if any(pattern in str(file_path) for pattern in ['.git', '__pycache__', '.claude']):
-                    continue
-                    
-                try:
-                    stat = file_path.stat()
-                    rel_path = file_path.relative_to(directory)
-                    
-                    snapshot[str(rel_path)] = FileMetadata(
-                        hash=self._calculate_hash(file_path),
-                        size=stat.st_size,
-                        mtime=stat.st_mtime
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to snapshot {file_path}: {e}")
+            # サイズとmtimeが前回と同じならハッシュを再利用（rsync方式）
+            prev = prevs[index]
+            prev_meta = prev.get(rel_path) if prev else None
+            if (prev_meta is not None and prev_meta.stable
+                    and prev_meta.size == stat.st_size and prev_meta.mtime == stat.st_mtime):
+                return index, rel_path, prev_meta
+                
+            try:
+                _, file_hash, size, mtime = self._hash_file_stat((file_path, stat))
+            except Exception as e:
+                logger.warning(f"Failed to snapshot {file_path}: {e}")
+                return index, rel_path, None
+                
+            return index, rel_path, FileMetadata(
+                hash=file_hash,
+                size=size,
+                mtime=mtime,
+                stable=time.time_ns() - stat.st_mtime_ns > RACY_MTIME_WINDOW_NS
+            )
+        
+        for index, rel_path, metadata in self._parallel_map(snapshot_file, files):
+            if metadata is not None:
+                snapshots[index][rel_path] = metadata
                     
-        return snapshot
+        return snapshots
     
     def _save_base_files(self, task_id: str, workspace: Path):
         """タスク開始時のファイル状態を保存
@@ -332,13 +759,7 @@ class ArtifactManager:
             workspace: タスクワークスペース
         """
         # 保存すべきファイルがあるかチェック
-        files_to_save = []
-        for file_path in workspace.rglob("*"):
-            if file_path.is_file():
-                # 除外パターン
-                if any(pattern in str(file_path) for pattern in ['.git', '__pycache__', '.claude']):
-                    continue
-                files_to_save.append(file_path)
+        files_to_save = [(path, rel_path) for rel_path, path, _ in self._iter_files(workspace)]
         
         # ファイルがない場合は何もしない
         if not files_to_save:
@@ -348,15 +769,17 @@ class ArtifactManager:
         task_base_dir = self.base_snapshots_dir / task_id
         task_base_dir.mkdir(parents=True, exist_ok=True)
         
-        # ファイルをコピー
-        for file_path in files_to_save:
-            rel_path = file_path.relative_to(workspace)
-            base_file_path = task_base_dir / rel_path
-            base_file_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # ファイルをコピー
-            shutil.copy2(file_path, base_file_path)
-            logger.debug(f"Saved base file: {rel_path}")
+        copy_pairs = [
+            (path, task_base_dir / rel_path)
+            for path, rel_path in files_to_save
+        ]
+        
+        # 親ディレクトリはまとめて作成
+        for parent in {dst.parent for _, dst in copy_pairs}:
+            parent.mkdir(parents=True, exist_ok=True)
+        
+        # ファイルをスレッドプールで並列コピー
+        self._parallel_map(lambda pair: clone_file(str(pair[0]), str(pair[1])), copy_pairs)
                 
         logger.info(f"Saved {len(files_to_save)} base files for task {task_id} in {task_base_dir}")
     
@@ -392,40 +815,18 @@ class ArtifactManager:
             
         # 共有ワークスペースが存在すればコピー
         if self.shared_workspace.exists():
-            shutil.copytree(self.shared_workspace, task_workspace)
+            shutil.copytree(self.shared_workspace, task_workspace, copy_function=clone_file)
             logger.info(f"Copied shared workspace to {task_workspace}")
         else:
             # 共有ワークスペースがなければ空のディレクトリを作成
             task_workspace.mkdir(parents=True, exist_ok=True)
             logger.info(f"Created empty workspace at {task_workspace}")
             
-        # プロジェクト直下の.claudeディレクトリがあればコピー
-        project_claude_dir = Path.cwd() / ".claude"
-        if project_claude_dir.exists():
-            task_claude_dir = task_workspace / ".claude"
-            if task_claude_dir.exists():
-                shutil.rmtree(task_claude_dir)
-            shutil.copytree(project_claude_dir, task_claude_dir)
-            logger.info(f"Copied .claude directory from project root to {task_workspace}")
-        else:
-            # .claude/settings.jsonを作成してWriteツールを許可
-            claude_dir = task_workspace / ".claude"
-            claude_dir.mkdir(exist_ok=True)
-            
-            settings_content = {
-                "permissions": {
-                    "allow": [
-                        "Write"
-                    ]
-                }
-            }
-            
-            settings_file = claude_dir / "settings.json"
-            settings_file.write_text(json.dumps(settings_content, indent=2))
-            logger.info(f"Created {settings_file} with Write permission")
+        setup_claude_settings(task_workspace)
             
         # スナップショットを記録
-        self.task_snapshots[task_id] = self._create_snapshot(task_workspace)
+        # （コピーはサイズとmtimeを保持するため、共有ワークスペースの既知のハッシュを再利用できる）
+        self.task_snapshots[task_id] = self._create_snapshot(task_workspace, self._shared_snapshot)
         
         # ベースファイルを保存
         self._save_base_files(task_id, task_workspace)
@@ -443,21 +844,19 @@ class ArtifactManager:
         Returns:
             変更の種類別ファイルリスト
         """
-        base_files = set(base_snapshot.keys())
-        current_files = set(current_snapshot.keys())
+        # キーのビューに対して直接集合演算する（setへのコピーを作らない）
+        base_files = base_snapshot.keys()
+        current_files = current_snapshot.keys()
         
-        changes = {
+        return {
             "new": list(current_files - base_files),
             "deleted": list(base_files - current_files),
-            "modified": []
+            # 変更されたファイルを検出
+            "modified": [
+                filepath for filepath in base_files & current_files
+                if base_snapshot[filepath].hash != current_snapshot[filepath].hash
+            ]
         }
-        
-        # 変更されたファイルを検出
-        for filepath in base_files & current_files:
-            if base_snapshot[filepath].hash != current_snapshot[filepath].hash:
-                changes["modified"].append(filepath)
-                
-        return changes
     
     async def integrate_task_results(self, task_id: str, task_workspace: Path,
                                    conflict_resolver: Optional['ConflictResolver'] = None) -> Dict[str, int]:
@@ -471,11 +870,82 @@ class ArtifactManager:
         Returns:
             統合結果のサマリー（new, modified, conflictの数）
         """
-        # 現在のスナップショットを作成
-        base_snapshot = self.task_snapshots.get(task_id, {})
-        task_snapshot = self._create_snapshot(task_workspace)
-        shared_snapshot = self._create_snapshot(self.shared_workspace)
+        results = await self.integrate_batch([(task_id, task_workspace)], conflict_resolver)
+        return results[0]
+    
+    async def integrate_batch(self, tasks: List[Tuple[str, Path]],
+                              conflict_resolver: Optional['ConflictResolver'] = None) -> List[Dict[str, int]]:
+        """複数タスクの結果をまとめて共有ワークスペースに統合
+        
+        全タスクと共有ワークスペースのスナップショットを1回の並列パスで作成し、
+        タスクを順番に適用する。共有ワークスペースのスナップショットは書き込みのたびに
+        更新するため、同じバッチ内の複数タスクが同じファイルを変更した場合も競合として扱われる。
+        
+        Args:
+            tasks: (タスクID, タスクのワークスペース) のリスト
+            conflict_resolver: 競合解決に使用するリゾルバー
+            
+        Returns:
+            tasksと同じ順序の統合結果のサマリー
+        """
+        base_snapshots = [self.task_snapshots.get(task_id, {}) for task_id, _ in tasks]
+        # 共有ワークスペースはタスク以外から変更されることもあるため毎回走査するが、
+        # サイズとmtimeが変わっていないファイルは前回のスナップショットを再利用する
+        *task_snapshots, shared_snapshot = self._create_snapshots(
+            [task_workspace for _, task_workspace in tasks] + [self.shared_workspace],
+            base_snapshots + [self._shared_snapshot]
+        )
+        
+        results = []
+        for (task_id, task_workspace), base_snapshot, task_snapshot in zip(
+                tasks, base_snapshots, task_snapshots):
+            results.append(await self._apply_task_changes(
+                task_id, task_workspace, base_snapshot, task_snapshot,
+                shared_snapshot, conflict_resolver
+            ))
+        self._shared_snapshot = shared_snapshot
+        return results
+    
+    def _file_metadata(self, file_path: Path) -> FileMetadata:
+        """書き込み直後のファイルのメタデータを取得"""
+        stat = file_path.stat()
+        return FileMetadata(
+            hash=self._cached_hash(file_path, stat),
+            size=stat.st_size,
+            mtime=stat.st_mtime
+        )
+    
+    def _save_versioned(
+        self,
+        task_id: str,
+        filepath: str,
+        src_file: Path,
+        task_snapshot: Dict[str, FileMetadata],
+        shared_snapshot: Dict[str, FileMetadata]
+    ) -> str:
+        """競合したタスク側のファイルをタスクIDのサフィックス付きで共有ワークスペースに保存
         
+        Returns:
+            保存したファイル名
+        """
+        dst_file = self.shared_workspace / filepath
+        versioned_name = f"{dst_file.stem}_{task_id}{dst_file.suffix}"
+        versioned_path = dst_file.parent / versioned_name
+        clone_file(str(src_file), str(versioned_path))
+        self._seed_hash_cache(versioned_path, task_snapshot[filepath])
+        shared_snapshot[str(versioned_path.relative_to(self.shared_workspace))] = task_snapshot[filepath]
+        return versioned_name
+    
+    async def _apply_task_changes(
+        self,
+        task_id: str,
+        task_workspace: Path,
+        base_snapshot: Dict[str, FileMetadata],
+        task_snapshot: Dict[str, FileMetadata],
+        shared_snapshot: Dict[str, FileMetadata],
+        conflict_resolver: Optional['ConflictResolver']
+    ) -> Dict[str, int]:
+        """1タスクの変更を共有ワークスペースに適用（shared_snapshotは書き込みに合わせて更新する）"""
         # 変更を検出
         changes = self._detect_changes(base_snapshot, task_snapshot)
         
@@ -486,80 +956,107 @@ class ArtifactManager:
             "deleted": 0
         }
         
-        # 共有ワークスペースが存在しない場合は作成
+        # タスク開始後に他のタスクが追加したファイルは、新規ではなく競合の候補として扱う
+        added_by_others = [fp for fp in changes["new"] if fp in shared_snapshot]
+        if added_by_others:
+            changes["new"] = [fp for fp in changes["new"] if fp not in shared_snapshot]
+            changes["modified"].extend(added_by_others)
+        
+        # 共有ワークスペースとコピー先の親ディレクトリをまとめて作成
         self.shared_workspace.mkdir(parents=True, exist_ok=True)
+        parents = {
+            (self.shared_workspace / filepath).parent
+            for filepath in changes["new"] + changes["modified"]
+        }
+        parents.discard(self.shared_workspace)
+        for parent in parents:
+            parent.mkdir(parents=True, exist_ok=True)
         
-        # 新規ファイルの処理
+        # 新規ファイルの処理（スレッドプールで並列コピー）
+        self._parallel_map(
+            lambda filepath: clone_file(
+                str(task_workspace / filepath), str(self.shared_workspace / filepath)
+            ),
+            changes["new"]
+        )
         for filepath in changes["new"]:
-            src_file = task_workspace / filepath
-            dst_file = self.shared_workspace / filepath
-            
-            # ディレクトリを作成
-            dst_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            # ファイルをコピー
-            shutil.copy2(src_file, dst_file)
+            self._seed_hash_cache(self.shared_workspace / filepath, task_snapshot[filepath])
+            shared_snapshot[filepath] = task_snapshot[filepath]
             logger.info(f"Added new file: {filepath}")
             result["new"] += 1
             
         # 変更されたファイルの処理
+        # 片側だけの変更はその場で反映し、両側で変更されたファイルは後でまとめてマージする
+        merges: List[Tuple[str, Optional[Path]]] = []
         for filepath in changes["modified"]:
             src_file = task_workspace / filepath
             dst_file = self.shared_workspace / filepath
             
             # 共有側も変更されているかチェック
             if filepath in shared_snapshot:
-                if filepath not in base_snapshot or \
+                if shared_snapshot[filepath].hash == task_snapshot[filepath].hash:
+                    # 共有側が既に同じ内容になっている
+                    logger.debug(f"Already up to date: {filepath}")
+                elif filepath not in base_snapshot or \
                    shared_snapshot[filepath].hash != base_snapshot[filepath].hash:
                     # 3-wayマージが必要
                     if conflict_resolver:
-                        logger.info(f"Attempting 3-way merge for {filepath}")
-                        
                         # ベースファイルを取得
                         base_file = None
                         if filepath in base_snapshot:
                             base_file = self._get_base_file(task_id, filepath)
                             if base_file:
                                 logger.debug(f"Found base file for {filepath}")
-                            
-                        # 3-wayマージを実行
-                        resolution = await conflict_resolver.resolve_three_way_conflict(
-                            base_file=base_file,
-                            shared_file=dst_file,
-                            task_file=src_file,
-                            task_id=task_id,
-                            artifact_manager=self
-                        )
-                        
-                        if resolution.strategy == "merged" and resolution.merged_file_path:
-                            shutil.copy2(resolution.merged_file_path, dst_file)
-                            logger.info(f"Successfully merged {filepath}")
-                            result["modified"] += 1
-                        else:
-                            # マージ失敗 - バージョンサフィックス付与
-                            versioned_name = f"{dst_file.stem}_{task_id}{dst_file.suffix}"
-                            versioned_path = dst_file.parent / versioned_name
-                            shutil.copy2(src_file, versioned_path)
-                            logger.warning(f"Merge failed for {filepath}, saved as {versioned_name}")
-                            result["conflict"] += 1
+                        merges.append((filepath, base_file))
                     else:
                         # ConflictResolverがない場合はバージョンサフィックス付与
-                        versioned_name = f"{dst_file.stem}_{task_id}{dst_file.suffix}"
-                        versioned_path = dst_file.parent / versioned_name
-                        shutil.copy2(src_file, versioned_path)
+                        versioned_name = self._save_versioned(task_id, filepath, src_file, task_snapshot, shared_snapshot)
                         logger.warning(f"Conflict detected for {filepath}, saved as {versioned_name}")
                         result["conflict"] += 1
                 else:
                     # 共有側は変更されていない - 単純に上書き
-                    shutil.copy2(src_file, dst_file)
+                    clone_file(str(src_file), str(dst_file))
+                    self._seed_hash_cache(dst_file, task_snapshot[filepath])
+                    shared_snapshot[filepath] = task_snapshot[filepath]
                     logger.info(f"Updated file: {filepath}")
                     result["modified"] += 1
             else:
                 # 共有側に存在しない（削除された？） - 新規として追加
-                dst_file.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(src_file, dst_file)
+                clone_file(str(src_file), str(dst_file))
+                self._seed_hash_cache(dst_file, task_snapshot[filepath])
+                shared_snapshot[filepath] = task_snapshot[filepath]
                 logger.info(f"Re-added file: {filepath}")
                 result["new"] += 1
+        
+        # 3-wayマージはファイルごとに独立しているため並行して実行する
+        # （Claudeでのマージの同時実行数はexecutorで制限される）
+        if merges:
+            logger.info(f"Attempting 3-way merge for {len(merges)} files: {[fp for fp, _ in merges]}")
+            resolutions = await asyncio.gather(*[
+                conflict_resolver.resolve_three_way_conflict(
+                    base_file=base_file,
+                    shared_file=self.shared_workspace / filepath,
+                    task_file=task_workspace / filepath,
+                    task_id=task_id,
+                    artifact_manager=self
+                )
+                for filepath, base_file in merges
+            ])
+            
+            for (filepath, _), resolution in zip(merges, resolutions):
+                dst_file = self.shared_workspace / filepath
+                if resolution.strategy == "merged" and resolution.merged_file_path:
+                    clone_file(str(resolution.merged_file_path), str(dst_file))
+                    shared_snapshot[filepath] = self._file_metadata(dst_file)
+                    logger.info(f"Successfully merged {filepath}")
+                    result["modified"] += 1
+                else:
+                    # マージ失敗 - バージョンサフィックス付与
+                    versioned_name = self._save_versioned(
+                        task_id, filepath, task_workspace / filepath, task_snapshot, shared_snapshot
+                    )
+                    logger.warning(f"Merge failed for {filepath}, saved as {versioned_name}")
+                    result["conflict"] += 1
                 
         # 削除されたファイルの処理（現在は記録のみ）
         for filepath in changes["deleted"]:
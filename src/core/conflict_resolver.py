@@ -2,19 +2,74 @@
 ファイル競合をClaude Codeを使って解決する
 """
 import asyncio
+import difflib
+import hashlib
+import itertools
 import logging
+import os
+import shutil
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, TYPE_CHECKING
-from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, TYPE_CHECKING
 
-from .task_executor import TaskExecutor, ExecutionResult
+from .task_executor import TaskExecutor
+from .artifact_manager import setup_claude_settings
+from .local_merge import GitMergeUnavailable, git_merge_file, merge_three_way
 
 if TYPE_CHECKING:
     from .artifact_manager import ArtifactManager
 
 logger = logging.getLogger(__name__)
 
+# マージタスクのタイムアウト（秒）
+MERGE_TASK_TIMEOUT = 300
+
+# ファイル比較時の読み込みバッファサイズ
+COMPARE_CHUNK_SIZE = 1024 * 1024
+
+# 入力の合計サイズ（文字数）がこれを超える場合、プロンプトには全文の代わりに差分を埋め込む
+MERGE_PROMPT_DIFF_THRESHOLD = 64 * 1024
+
+
+def files_identical(file_a: Path, file_b: Path) -> bool:
+    """2つのファイルの内容がバイト単位で同一かどうか
+    
+    サイズが異なれば読み込まずにFalseを返す
+    """
+    if file_a.stat().st_size != file_b.stat().st_size:
+        return False
+    with open(file_a, "rb") as fa, open(file_b, "rb") as fb:
+        while True:
+            chunk_a = fa.read(COMPARE_CHUNK_SIZE)
+            if chunk_a != fb.read(COMPARE_CHUNK_SIZE):
+                return False
+            if not chunk_a:
+                return True
+
+
+def _merge_key(kind: str, name: str, *paths: Optional[Path]) -> str:
+    """マージの入力（ファイル名と各ファイルの内容）から重複判定用のキーを作る"""
+    digest = hashlib.blake2b(f"{kind}\0{name}".encode("utf-8"))
+    for path in paths:
+        if path is not None and path.exists():
+            digest.update(b"\0")
+            digest.update(path.read_bytes())
+        else:
+            # 存在しないファイルは空ファイルと区別する
+            digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def _unified_diff(from_content: str, to_content: str, from_label: str, to_label: str) -> str:
+    """2つの内容のunified diffを生成（前後5行のコンテキスト付き）"""
+    return "".join(difflib.unified_diff(
+        from_content.splitlines(keepends=True),
+        to_content.splitlines(keepends=True),
+        fromfile=from_label,
+        tofile=to_label,
+        n=5
+    ))
+
 
 @dataclass
 class ConflictResolution:
@@ -24,18 +79,117 @@ class ConflictResolution:
     message: str = ""
 
 
+_MERGE_INSTRUCTIONS = """You are tasked with merging two versions of {name}.
+
+Please analyze both files and create an intelligent merge that:
+1. Combines functionality from both versions
+2. Resolves any conflicts appropriately
+3. Maintains code quality and consistency
+
+If the files serve fundamentally different purposes or cannot be meaningfully merged:
+- Create a file named "CANNOT_MERGE.txt" explaining why
+- Do NOT create the merged file
+
+Otherwise:
+- Create the merged version as {name}
+- Add a comment at the top explaining what was merged
+
+"""
+
+_THREE_WAY_INSTRUCTIONS = """You are tasked with performing a 3-way merge for {name}.
+
+This is a 3-way merge scenario where:
+- BASE: The original version both changes started from
+- SHARED: Changes made by other tasks in the shared workspace
+- TASK: Changes made by the current task
+
+Please analyze all three versions and create an intelligent merge that:
+1. Incorporates changes from both SHARED and TASK versions
+2. Resolves conflicts by understanding the intent of each change
+3. Maintains code quality and consistency
+4. Preserves all functionality from both versions
+
+If the changes are fundamentally incompatible:
+- Create a file named "CANNOT_MERGE.txt" explaining why
+- Do NOT create the merged file
+
+Otherwise:
+- Create the merged version as {name}
+- Add a comment at the top explaining the merge
+
+"""
+
+
 class ConflictResolver:
     """Claude Codeを使った競合解決"""
     
-    def __init__(self, workspace_dir: Path):
+    # マージプロンプトのテンプレート（固定部分はimport時に一度だけ組み立てる）
+    _MERGE_TEMPLATE = _MERGE_INSTRUCTIONS + """=== Current version ({name}) ===
+{existing}
+
+=== New version (from {parent}) ===
+{new}
+
+Please create the merged version now.
+"""
+    
+    _MERGE_DIFF_TEMPLATE = _MERGE_INSTRUCTIONS + """=== Current version ({name}) ===
+{existing}
+
+=== New version (from {parent}) as a unified diff against the current version ===
+{new}
+
+Please create the merged version now.
+"""
+    
+    _THREE_WAY_TEMPLATE = _THREE_WAY_INSTRUCTIONS + """=== BASE version (original) ===
+{base}
+
+=== SHARED version (from shared workspace) ===
+{shared}
+
+=== TASK version (from current task) ===
+{task}
+
+Please create the merged version now, incorporating changes from both SHARED and TASK versions.
+"""
+    
+    _THREE_WAY_DIFF_TEMPLATE = _THREE_WAY_INSTRUCTIONS + """=== SHARED version (from shared workspace) ===
+{shared}
+
+=== Changes made in SHARED (unified diff from BASE) ===
+{shared_diff}
+
+=== Changes made in TASK (unified diff from BASE) ===
+{task_diff}
+
+Please create the merged version now, incorporating changes from both SHARED and TASK versions.
+"""
+    
+    def __init__(self, workspace_dir: Path, executor: Optional[TaskExecutor] = None):
+        """
+        Args:
+            workspace_dir: ワークスペースのルート
+            executor: マージタスクの実行に使うexecutor。Orchestratorのexecutorを渡すと
+                通常タスクと同じ並列数の上限を共有する。省略時は専用のものを作成
+        """
         self.workspace_dir = workspace_dir
         self.merge_workspace = workspace_dir / ".merge_tasks"
         self.merge_workspace.mkdir(exist_ok=True)
         
+        # マージタスクIDの連番（同じ秒に複数のマージが走っても衝突しない）
+        self._merge_counter = itertools.count()
+        
+        # 実行中のマージ（内容のハッシュ -> マージ処理）
+        self._inflight: Dict[str, "asyncio.Future[ConflictResolution]"] = {}
+        
+        # ローカルマージに使うgit（histogram非対応と分かったらNoneにする）
+        self._git_path = shutil.which("git")
+        
         # マージタスク実行用のexecutor
-        self.executor = TaskExecutor(
+        self.executor = executor or TaskExecutor(
             workspace_dir=str(self.merge_workspace),
-            timeout=300  # 5分のタイムアウト
+            timeout=MERGE_TASK_TIMEOUT
         )
     
     async def resolve_conflict(
@@ -47,10 +201,25 @@ class ConflictResolver:
     ) -> ConflictResolution:
         """ファイル競合をClaude Codeで解決"""
         
-        merge_task_id = f"merge_{existing_file.stem}_{int(datetime.now().timestamp())}"
+        # 内容が同一なら競合ではない
+        if files_identical(existing_file, new_file):
+            logger.info(f"{existing_file.name} is identical, no merge needed")
+            return ConflictResolution(
+                strategy="merged",
+                merged_file_path=new_file,
+                message="Files are identical"
+            )
+        
+        # 同じ内容のマージが実行中なら、その結果を共有する
+        key = await asyncio.to_thread(_merge_key, "2way", existing_file.name, existing_file, new_file)
+        return await self._coalesce(key, lambda: self._merge_two_way(existing_file, new_file))
+    
+    async def _merge_two_way(self, existing_file: Path, new_file: Path) -> ConflictResolution:
+        """Claude Codeで2-wayマージを実行"""
+        merge_task_id = f"merge_{existing_file.stem}_{next(self._merge_counter)}"
         
         # マージ用のプロンプトを作成
-        prompt = self._create_merge_prompt(existing_file, new_file)
+        prompt = await self._create_merge_prompt(existing_file, new_file)
         
         # Claudeでマージを実行
         logger.info(f"Attempting to merge {existing_file.name} using Claude Code")
@@ -59,14 +228,13 @@ class ConflictResolver:
             result = await self.executor.execute({
                 "id": merge_task_id,
                 "name": f"Merge {existing_file.name}",
-                "prompt": prompt
-            }, artifact_manager)
+                "prompt": prompt,
+                "timeout": MERGE_TASK_TIMEOUT
+            }, task_dir=await asyncio.to_thread(self._prepare_merge_dir, merge_task_id))
             
             if result.success:
                 # マージ結果を確認
-                return await self._check_merge_result(
-                    result, merge_task_id, existing_file.name
-                )
+                return await self._check_merge_result(merge_task_id, existing_file.name)
             else:
                 logger.error(f"Merge task failed: {result.error}")
                 return ConflictResolution(
@@ -81,79 +249,116 @@ class ConflictResolver:
                 message=f"Merge exception: {str(e)}"
             )
     
-    def _create_merge_prompt(self, existing_file: Path, new_file: Path) -> str:
+    async def _coalesce(
+        self,
+        key: str,
+        start: Callable[[], Awaitable[ConflictResolution]]
+    ) -> ConflictResolution:
+        """同じキーのマージが実行中ならその完了を待ち、なければ開始する"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 呼び出し元の1つがキャンセルされても、他の待機者のマージは継続する
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    async def _read_texts(*paths: Path) -> List[str]:
+        """複数ファイルをスレッドプールで並行して読み込む（イベントループをブロックしない）"""
+        loop = asyncio.get_running_loop()
+        return list(await asyncio.gather(
+            *[loop.run_in_executor(None, path.read_text) for path in paths]
+        ))
+    
+    async def _create_merge_prompt(self, existing_file: Path, new_file: Path) -> str:
         """マージ用プロンプトを生成"""
         # ファイル内容を読み込む
-        existing_content = existing_file.read_text()
-        new_content = new_file.read_text()
+        existing_content, new_content = await self._read_texts(existing_file, new_file)
         
-        return f"""You are tasked with merging two versions of {existing_file.name}.
-
-Please analyze both files and create an intelligent merge that:
-1. Combines functionality from both versions
-2. Resolves any conflicts appropriately
-3. Maintains code quality and consistency
-
-If the files serve fundamentally different purposes or cannot be meaningfully merged:
-- Create a file named "CANNOT_MERGE.txt" explaining why
-- Do NOT create the merged file
-
-Otherwise:
-- Create the merged version as {existing_file.name}
-- Add a comment at the top explaining what was merged
-
-=== Current version ({existing_file.name}) ===
-{existing_content}
-
-=== New version (from {new_file.parent.name}) ===
-{new_content}
-
-Please create the merged version now.
-"""
+        if len(existing_content) + len(new_content) > MERGE_PROMPT_DIFF_THRESHOLD:
+            # 大きなファイルは新バージョンを差分として渡し、プロンプトを小さくする
+            template = self._MERGE_DIFF_TEMPLATE
+            new_content = _unified_diff(existing_content, new_content, "current", "new")
+        else:
+            template = self._MERGE_TEMPLATE
+        
+        return template.format(
+            name=existing_file.name,
+            parent=new_file.parent.name,
+            existing=existing_content,
+            new=new_content
+        )
     
-    async def _check_merge_result(
-        self,
-        result: ExecutionResult,
-        merge_task_id: str,
-        filename: str
-    ) -> ConflictResolution:
+    def _prepare_merge_dir(self, merge_task_id: str) -> Path:
+        """マージタスク専用の空の作業ディレクトリを用意する
+        
+        共有ワークスペースのコピーでは実行しない（マージ対象のファイルが最初から存在すると、
+        Claudeが何も書かなくてもマージ済みと誤判定するため）。
+        """
+        merge_task_dir = self.merge_workspace / merge_task_id
+        if merge_task_dir.exists():
+            shutil.rmtree(merge_task_dir)
+        merge_task_dir.mkdir(parents=True)
+        setup_claude_settings(merge_task_dir)
+        return merge_task_dir
+    
+    async def _check_merge_result(self, merge_task_id: str, filename: str) -> ConflictResolution:
         """マージ結果を確認"""
         
+        # マージタスクは専用の空ディレクトリで実行されるため、存在するファイルはClaudeの出力
         merge_task_dir = self.merge_workspace / merge_task_id
         
-        # マージ不可ファイルをチェック
-        cannot_merge_file = merge_task_dir / "CANNOT_MERGE.txt"
-        if cannot_merge_file.exists():
-            reason = cannot_merge_file.read_text()
-            logger.info(f"Cannot merge {filename}: {reason}")
+        try:
+            # マージ不可ファイルをチェック
+            cannot_merge_file = merge_task_dir / "CANNOT_MERGE.txt"
+            if cannot_merge_file.exists():
+                reason = cannot_merge_file.read_text()
+                logger.info(f"Cannot merge {filename}: {reason}")
+                return ConflictResolution(
+                    strategy="version",
+                    message=f"Cannot merge: {reason}"
+                )
+            
+            # マージされたファイルをチェック
+            merged_file = merge_task_dir / filename
+            if merged_file.exists():
+                # 作業ディレクトリを削除する前にマージ結果だけを退避する
+                result_dir = self.merge_workspace / f"{merge_task_id}.result"
+                result_dir.mkdir(parents=True, exist_ok=True)
+                kept_file = Path(shutil.move(str(merged_file), str(result_dir / filename)))
+                
+                logger.info(f"Successfully merged {filename}")
+                return ConflictResolution(
+                    strategy="merged",
+                    merged_file_path=kept_file,
+                    message="Successfully merged by Claude Code"
+                )
+            
+            # ファイルが見つからない
+            logger.warning(f"Merge completed but no output file found for {filename}")
             return ConflictResolution(
                 strategy="version",
-                message=f"Cannot merge: {reason}"
+                message="Merge completed but no output file found"
             )
-        
-        # マージされたファイルをチェック
-        merged_file = merge_task_dir / filename
-        if merged_file.exists():
-            logger.info(f"Successfully merged {filename}")
-            return ConflictResolution(
-                strategy="merged",
-                merged_file_path=merged_file,
-                message="Successfully merged by Claude Code"
-            )
-        
-        # ファイルが見つからない
-        logger.warning(f"Merge completed but no output file found for {filename}")
-        return ConflictResolution(
-            strategy="version",
-            message="Merge completed but no output file found"
-        )
+        finally:
+            # マージごとの作業ディレクトリは結果を確認したら不要
+            shutil.rmtree(merge_task_dir, ignore_errors=True)
     
     def cleanup_merge_workspace(self):
         """マージ作業ディレクトリをクリーンアップ"""
-        import shutil
-        if self.merge_workspace.exists():
-            shutil.rmtree(self.merge_workspace)
-            logger.info("Cleaned up merge workspace")
+        if not self.merge_workspace.exists():
+            return
+            
+        # 空なら再帰的な走査は不要
+        with os.scandir(self.merge_workspace) as entries:
+            is_empty = next(entries, None) is None
+            
+        if is_empty:
+            self.merge_workspace.rmdir()
+        else:
+            shutil.rmtree(self.merge_workspace, ignore_errors=True)
+        logger.info("Cleaned up merge workspace")
     
     async def resolve_three_way_conflict(
         self,
@@ -170,15 +375,57 @@ Please create the merged version now.
             shared_file: 共有ワークスペースの現在のファイル
             task_file: タスクが生成したファイル
             task_id: タスクID
+            artifact_manager: 未使用（マージタスクは共有コンテキストを使わず専用の空ディレクトリで実行する）
             
         Returns:
             ConflictResolution: マージ結果
         """
         
-        merge_task_id = f"3way_merge_{shared_file.stem}_{int(datetime.now().timestamp())}"
+        # 内容が同一なら競合ではない
+        if files_identical(shared_file, task_file):
+            logger.info(f"{shared_file.name} is identical, no merge needed")
+            return ConflictResolution(
+                strategy="merged",
+                merged_file_path=task_file,
+                message="Files are identical"
+            )
+        
+        # 共有側がベースから変更されていなければ、タスク側の変更をそのまま採用すればよい
+        if base_file and base_file.exists() and files_identical(base_file, shared_file):
+            logger.info(f"{shared_file.name} was only changed by the task, no merge needed")
+            return ConflictResolution(
+                strategy="merged",
+                merged_file_path=task_file,
+                message="Shared version is unchanged from base"
+            )
+        
+        # 同じ内容のマージが実行中なら、その結果を共有する
+        key = await asyncio.to_thread(
+            _merge_key, "3way", shared_file.name, base_file, shared_file, task_file
+        )
+        return await self._coalesce(
+            key, lambda: self._merge_three_way(base_file, shared_file, task_file)
+        )
+    
+    async def _merge_three_way(
+        self,
+        base_file: Optional[Path],
+        shared_file: Path,
+        task_file: Path
+    ) -> ConflictResolution:
+        """ローカル、またはClaude Codeで3-wayマージを実行"""
+        merge_task_id = f"3way_merge_{shared_file.stem}_{next(self._merge_counter)}"
+        
+        # 機械的にマージできる場合はClaudeを呼び出さない
+        # （差分計算はCPUを使うため、イベントループをブロックしないようスレッドで実行）
+        local_resolution = await asyncio.to_thread(
+            self._try_local_merge, base_file, shared_file, task_file, merge_task_id
+        )
+        if local_resolution:
+            return local_resolution
         
         # 3-wayマージ用のプロンプトを作成
-        prompt = self._create_three_way_merge_prompt(base_file, shared_file, task_file)
+        prompt = await self._create_three_way_merge_prompt(base_file, shared_file, task_file)
         
         # Claudeで3-wayマージを実行
         logger.info(f"Attempting 3-way merge for {shared_file.name} using Claude Code")
@@ -187,14 +434,13 @@ Please create the merged version now.
             result = await self.executor.execute({
                 "id": merge_task_id,
                 "name": f"3-way merge {shared_file.name}",
-                "prompt": prompt
-            }, artifact_manager)
+                "prompt": prompt,
+                "timeout": MERGE_TASK_TIMEOUT
+            }, task_dir=await asyncio.to_thread(self._prepare_merge_dir, merge_task_id))
             
             if result.success:
                 # マージ結果を確認
-                return await self._check_merge_result(
-                    result, merge_task_id, shared_file.name
-                )
+                return await self._check_merge_result(merge_task_id, shared_file.name)
             else:
                 logger.error(f"3-way merge task failed: {result.error}")
                 return ConflictResolution(
@@ -209,7 +455,71 @@ Please create the merged version now.
                 message=f"3-way merge exception: {str(e)}"
             )
     
-    def _create_three_way_merge_prompt(
+    def _try_local_merge(
+        self,
+        base_file: Optional[Path],
+        shared_file: Path,
+        task_file: Path,
+        merge_task_id: str
+    ) -> Optional[ConflictResolution]:
+        """行単位の3-wayマージをローカルで試みる
+        
+        両側の変更が重ならない（または同一の）場合のみ成功する。
+        gitがhistogramアルゴリズムに対応していればgit merge-fileを、
+        そうでなければdifflibベースのマージを使う。
+        
+        Returns:
+            マージ成功時はConflictResolution、競合が残る場合はNone
+        """
+        merged_content = None
+        merged = False
+        
+        if self._git_path:
+            if not base_file or not base_file.exists():
+                # ベースがない場合は空ファイルをベースとする（全マージで同じファイルを使い回す）
+                base_file = self._empty_base_file()
+            try:
+                merged_content = git_merge_file(self._git_path, base_file, shared_file, task_file)
+                merged = True
+            except GitMergeUnavailable as e:
+                logger.debug(f"git merge-file unavailable, falling back to difflib: {e}")
+                self._git_path = None
+                
+        if not merged:
+            try:
+                base_content = base_file.read_text() if base_file and base_file.exists() else ""
+                merged_content = merge_three_way(
+                    base_content, shared_file.read_text(), task_file.read_text()
+                )
+            except UnicodeDecodeError:
+                # テキストとして扱えないファイルはClaudeに任せる
+                return None
+            
+        if merged_content is None:
+            return None
+            
+        # ディレクトリはマージできた場合のみ作成する（Claudeでのマージに同じIDを使うため）
+        merge_task_dir = self.merge_workspace / merge_task_id
+        merge_task_dir.mkdir(parents=True, exist_ok=True)
+        merged_file = merge_task_dir / shared_file.name
+        merged_file.write_text(merged_content)
+        
+        logger.info(f"Merged {shared_file.name} locally without conflicts")
+        return ConflictResolution(
+            strategy="merged",
+            merged_file_path=merged_file,
+            message="Successfully merged locally (no conflicting changes)"
+        )
+    
+    def _empty_base_file(self) -> Path:
+        """ベースがない場合に使う空ファイル（なければ作成）"""
+        empty_base = self.merge_workspace / ".empty_base"
+        if not empty_base.exists():
+            empty_base.parent.mkdir(parents=True, exist_ok=True)
+            empty_base.touch()
+        return empty_base
+    
+    async def _create_three_way_merge_prompt(
         self,
         base_file: Optional[Path],
         shared_file: Path,
@@ -218,39 +528,27 @@ Please create the merged version now.
         """3-wayマージ用プロンプトを生成"""
         
         # ファイル内容を読み込む
-        base_content = base_file.read_text() if base_file and base_file.exists() else ""
-        shared_content = shared_file.read_text()
-        task_content = task_file.read_text()
+        if base_file and base_file.exists():
+            base_content, shared_content, task_content = await self._read_texts(
+                base_file, shared_file, task_file
+            )
+        else:
+            base_content = ""
+            shared_content, task_content = await self._read_texts(shared_file, task_file)
         
-        return f"""You are tasked with performing a 3-way merge for {shared_file.name}.
-
-This is a 3-way merge scenario where:
-- BASE: The original version both changes started from
-- SHARED: Changes made by other tasks in the shared workspace
-- TASK: Changes made by the current task
-
-Please analyze all three versions and create an intelligent merge that:
-1. Incorporates changes from both SHARED and TASK versions
-2. Resolves conflicts by understanding the intent of each change
-3. Maintains code quality and consistency
-4. Preserves all functionality from both versions
-
-If the changes are fundamentally incompatible:
-- Create a file named "CANNOT_MERGE.txt" explaining why
-- Do NOT create the merged file
-
-Otherwise:
-- Create the merged version as {shared_file.name}
-- Add a comment at the top explaining the merge
-
-=== BASE version (original) ===
-{base_content if base_content else "# File did not exist in base version"}
-
-=== SHARED version (from shared workspace) ===
-{shared_content}
-
-=== TASK version (from current task) ===
-{task_content}
-
-Please create the merged version now, incorporating changes from both SHARED and TASK versions.
-"""
\ No newline at end of file
+        total_size = len(base_content) + len(shared_content) + len(task_content)
+        if base_content and total_size > MERGE_PROMPT_DIFF_THRESHOLD:
+            # 大きなファイルはSHAREDの全文と、BASEからの各変更の差分だけを渡す
+            return self._THREE_WAY_DIFF_TEMPLATE.format(
+                name=shared_file.name,
+                shared=shared_content,
+                shared_diff=_unified_diff(base_content, shared_content, "base", "shared"),
+                task_diff=_unified_diff(base_content, task_content, "base", "task")
+            )
+        
+        return self._THREE_WAY_TEMPLATE.format(
+            name=shared_file.name,
+            base=base_content if base_content else "# File did not exist in base version",
+            shared=shared_content,
+            task=task_content
+        )
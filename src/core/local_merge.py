@@ -0,0 +1,162 @@
+"""
+行単位の3-wayマージ（diff3）
+Claude Codeを呼び出す前に、機械的に解決できる競合をローカルで解決する
+"""
+import difflib
+import logging
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (base開始, base終了, shared開始, shared終了, task開始, task終了)
+SyncRegion = Tuple[int, int, int, int, int, int]
+
+
+def _intersect(ra: Tuple[int, int], rb: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    """2つの区間の共通部分を返す（重ならなければNone）"""
+    start = max(ra[0], rb[0])
+    end = min(ra[1], rb[1])
+    if start < end:
+        return start, end
+    return None
+
+
+def _find_sync_regions(base: Sequence[str], shared: Sequence[str],
+                       task: Sequence[str]) -> List[SyncRegion]:
+    """base・shared・taskの3つで共通している区間を求める
+
+    末尾には長さ0の番兵区間を追加する。
+    """
+    shared_matches = difflib.SequenceMatcher(None, base, shared, autojunk=False).get_matching_blocks()
+    task_matches = difflib.SequenceMatcher(None, base, task, autojunk=False).get_matching_blocks()
+
+    regions = []
+    i_shared = i_task = 0
+    while i_shared < len(shared_matches) and i_task < len(task_matches):
+        s_base, s_match, s_len = shared_matches[i_shared]
+        t_base, t_match, t_len = task_matches[i_task]
+
+        common = _intersect((s_base, s_base + s_len), (t_base, t_base + t_len))
+        if common:
+            start, end = common
+            s_start = s_match + (start - s_base)
+            t_start = t_match + (start - t_base)
+            regions.append((start, end, s_start, s_start + (end - start),
+                            t_start, t_start + (end - start)))
+
+        if s_base + s_len < t_base + t_len:
+            i_shared += 1
+        else:
+            i_task += 1
+
+    regions.append((len(base), len(base), len(shared), len(shared), len(task), len(task)))
+    return regions
+
+
+def merge_lines(base: Sequence[str], shared: Sequence[str],
+                task: Sequence[str]) -> Optional[List[str]]:
+    """行のリストを3-wayマージする
+
+    片側だけが変更した箇所はその変更を採用し、両側が同じ変更をした箇所
+    （見かけ上の競合）はそのまま採用する。両側が異なる変更をした箇所があればNone。
+
+    Returns:
+        マージ結果の行リスト（競合があればNone）
+    """
+    merged: List[str] = []
+    i_base = i_shared = i_task = 0
+
+    for base_start, base_end, shared_start, shared_end, task_start, task_end in \
+            _find_sync_regions(base, shared, task):
+        base_chunk = base[i_base:base_start]
+        shared_chunk = shared[i_shared:shared_start]
+        task_chunk = task[i_task:task_start]
+
+        if shared_chunk or task_chunk:
+            if shared_chunk == task_chunk:
+                merged.extend(shared_chunk)
+            elif shared_chunk == base_chunk:
+                merged.extend(task_chunk)
+            elif task_chunk == base_chunk:
+                merged.extend(shared_chunk)
+            else:
+                return None
+
+        merged.extend(base[base_start:base_end])
+        i_base, i_shared, i_task = base_end, shared_end, task_end
+
+    return merged
+
+
+def merge_three_way(base: str, shared: str, task: str) -> Optional[str]:
+    """テキストを3-wayマージする
+
+    Args:
+        base: ベース（両方の変更の起点）の内容
+        shared: 共有ワークスペース側の内容
+        task: タスク側の内容
+
+    Returns:
+        マージ結果（競合があればNone）
+    """
+    merged = merge_lines(
+        base.splitlines(keepends=True),
+        shared.splitlines(keepends=True),
+        task.splitlines(keepends=True)
+    )
+    if merged is None:
+        return None
+    return "".join(merged)
+
+
+# gitがオプションの誤り（usage）で終了したときの終了コード
+GIT_USAGE_ERROR = 129
+
+
+class GitMergeUnavailable(Exception):
+    """git merge-fileが使えない（未対応のオプションなど）"""
+
+
+def git_merge_file(git_path: str, base: Path, shared: Path, task: Path) -> Optional[str]:
+    """git merge-fileのhistogramアルゴリズムで3-wayマージする
+
+    histogramはMyersより見かけ上の競合が少なく、病的な入力でも高速。
+
+    Args:
+        git_path: gitコマンドのパス
+        base: ベースファイル
+        shared: 共有ワークスペース側のファイル
+        task: タスク側のファイル
+
+    Returns:
+        マージ結果（競合がある、またはこのファイルのマージに失敗した場合はNone）
+
+    Raises:
+        GitMergeUnavailable: gitがhistogramに対応していない場合（usageエラー）
+    """
+    process = subprocess.run(
+        [git_path, "merge-file", "-p", "-q", "--diff-algorithm=histogram",
+         str(shared), str(base), str(task)],
+        capture_output=True
+    )
+
+    # 終了コードは競合の数
+    if process.returncode == 0:
+        try:
+            return process.stdout.decode("utf-8")
+        except UnicodeDecodeError:
+            # テキストとして扱えないファイルはマージしない
+            return None
+        
+    stderr = process.stderr.decode("utf-8", errors="replace").strip()
+    if process.returncode == GIT_USAGE_ERROR or (
+            "unknown option" in stderr and "diff-algorithm" in stderr):
+        # オプションに対応していないgitでは、以降のマージでも使えない
+        raise GitMergeUnavailable(stderr)
+    
+    # 競合、またはバイナリや読み込めないファイルなどこのファイル固有の失敗
+    if process.returncode < 0 or process.returncode >= 128:
+        logger.debug(f"git merge-file failed for {task} (exit {process.returncode}): {stderr}")
+    return None
@@ -1,18 +1,26 @@
 import asyncio
-import json
 import logging
+import os
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Callable, Any
+from typing import List, Dict, Optional, Callable, Any, Set, Tuple
 
-from .task_graph_engine import TaskGraphEngine, TaskStatus
+from .task_graph_engine import TaskGraphEngine, TaskStatus, load_wbs
 from .task_executor import TaskExecutor, ExecutionResult
 from .artifact_manager import ArtifactManager
 from .conflict_resolver import ConflictResolver
+from .serialization import dumps, loads
 
 
 logger = logging.getLogger(__name__)
 
+# 状態ファイルの書き込みを間引く間隔（秒）
+STATE_FLUSH_INTERVAL = 0.5
+
+# ドライランで1タスクの実行にかかったとみなす時間（秒）
+DRY_RUN_TASK_DELAY = 0.1
+
 
 class Orchestrator:
     def __init__(
@@ -35,6 +43,7 @@ class Orchestrator:
         
         # コンポーネントの初期化
         self.graph_engine = TaskGraphEngine(wbs_path)
+        self._task_prompts = self._load_task_prompts(wbs_path)
         self.task_executor = TaskExecutor(
             workspace_dir=str(self.workspace_dir),
             max_concurrent=max_concurrent
@@ -51,47 +60,104 @@ class Orchestrator:
         )
         
         # 競合解決リゾルバーの初期化
-        self.conflict_resolver = ConflictResolver(workspace_dir=self.workspace_dir)
+        # マージタスクも通常タスクと同じexecutor（並列数の上限）を使う
+        self.conflict_resolver = ConflictResolver(
+            workspace_dir=self.workspace_dir,
+            executor=self.task_executor
+        )
         
         # テスト用のフラグ
         self._simulate_error: Optional[str] = None
         self._max_tasks: Optional[int] = None
         
+        # 状態保存のデバウンス用
+        self._state_dirty = False
+        self._state_flush_handle: Optional[asyncio.TimerHandle] = None
+        self._state_flush_task: Optional[asyncio.Task] = None
+        self._state_write_lock = asyncio.Lock()
+        
     def _load_state(self):
         """保存された状態を読み込む"""
         if self.state_file and self.state_file.exists():
-            with open(self.state_file, 'r') as f:
-                state = json.load(f)
+            state = loads(self.state_file.read_bytes())
                 
-            # タスクの状態を復元
-            for task_id, status_str in state.get("task_status", {}).items():
-                if task_id in self.graph_engine.tasks:
-                    status = TaskStatus(status_str)
-                    self.graph_engine.update_task_status(task_id, status)
+            # タスクの状態を復元（WBSから消えたタスクは無視し、まとめて反映する）
+            self.graph_engine.update_task_statuses({
+                task_id: TaskStatus(status_str)
+                for task_id, status_str in state.get("task_status", {}).items()
+                if task_id in self.graph_engine.tasks
+            })
                     
             logger.info(f"State loaded from {self.state_file}")
             
     def _save_state(self):
-        """現在の状態を保存"""
-        if self.state_file:
-            state = {
-                "timestamp": datetime.now().isoformat(),
-                "task_status": {
-                    task_id: task.status.value
-                    for task_id, task in self.graph_engine.tasks.items()
-                }
+        """現在の状態の保存を予約する
+        
+        書き込みはSTATE_FLUSH_INTERVALごとにまとめて行う（run()の終了時には必ず書き出す）。
+        イベントループ外から呼ばれた場合は即座に書き込む。
+        """
+        if not self.state_file:
+            return
+            
+        self._state_dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_state(self._snapshot_state())
+            self._state_dirty = False
+            return
+            
+        if self._state_flush_handle is None:
+            self._state_flush_handle = loop.call_later(
+                STATE_FLUSH_INTERVAL, self._start_state_flush
+            )
+            
+    def _start_state_flush(self):
+        """予約時刻になった状態の書き出しを開始する
+        
+        タスクへの参照を保持し、GCによる消失を防いでrun()の終了時に結果を回収する。
+        """
+        self._state_flush_handle = None
+        self._state_flush_task = asyncio.get_running_loop().create_task(self._flush_state())
+            
+    def _snapshot_state(self) -> Dict[str, Any]:
+        """保存する状態を作成"""
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "task_status": {
+                task_id: task.status.value
+                for task_id, task in self.graph_engine.tasks.items()
             }
+        }
+        
+    def _write_state(self, state: Dict[str, Any]):
+        """状態ファイルを書き込む（一時ファイル経由で置き換える）"""
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_file.with_name(self.state_file.name + ".tmp")
+        tmp_path.write_bytes(dumps(state, indent=True))
+        os.replace(tmp_path, self.state_file)
+        
+    async def _flush_state(self):
+        """予約された状態をスレッドで書き出す"""
+        if self._state_flush_handle is not None:
+            self._state_flush_handle.cancel()
+            self._state_flush_handle = None
+            
+        # 書き込みは1つずつ行い、古い状態で上書きしないようにする
+        async with self._state_write_lock:
+            if not self._state_dirty:
+                return
+            state = self._snapshot_state()
+            self._state_dirty = False
+            await asyncio.to_thread(self._write_state, state)
             
-            self.state_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.state_file, 'w') as f:
-                json.dump(state, f, indent=2)
-                
     def _emit_progress(self, event_type: str, **kwargs):
         """進捗状況を通知"""
         if self.progress_callback:
+            # 文字列化は必要な購読者に任せ、ここではエポックからのナノ秒だけを渡す
             update = {
                 "type": event_type,
-                "timestamp": datetime.now().isoformat(),
+                "ts_ns": time.time_ns(),
                 **kwargs
             }
             self.progress_callback(update)
@@ -109,7 +175,7 @@ class Orchestrator:
         
         if self.dry_run:
             # ドライランモード：実際の実行はスキップ
-            await asyncio.sleep(0.1)  # 実行をシミュレート
+            await asyncio.sleep(DRY_RUN_TASK_DELAY)  # 実行をシミュレート
             
             # エラーシミュレーション（テスト用）
             if self._simulate_error == task_id:
@@ -132,19 +198,7 @@ class Orchestrator:
         if result.success:
             self.graph_engine.update_task_status(task_id, TaskStatus.COMPLETED)
             self._emit_progress("task_completed", task_id=task_id)
-            
-            # 成果物を登録（ドライランでない場合）
-            if not self.dry_run and result.artifacts and result.workspace:
-                # タスク結果を共有ワークスペースに統合（常に実行）
-                integration_result = await self.artifact_manager.integrate_task_results(
-                    task_id=task_id,
-                    task_workspace=result.workspace,
-                    conflict_resolver=self.conflict_resolver
-                )
-                logger.info(f"Integrated task {task_id} results: "
-                          f"{integration_result['new']} new, "
-                          f"{integration_result['modified']} modified, "
-                          f"{integration_result.get('conflict', 0)} conflicts")
+            # 共有ワークスペースへの統合はrun()で完了したタスクをまとめて行う
         else:
             self.graph_engine.update_task_status(task_id, TaskStatus.FAILED)
             self._emit_progress("task_failed", task_id=task_id, error=result.error)
@@ -163,61 +217,104 @@ class Orchestrator:
         summary = self.graph_engine.get_progress_summary()
         self._emit_progress("project_started", summary=summary)
         
-        executed_count = 0
+        launched_count = 0
+        running: Dict[asyncio.Task, str] = {}
+        running_ids: Set[str] = set()  # runningの値（投入済みかの判定をO(1)にする）
+        failure: Optional[BaseException] = None
         
         try:
-            while not self.graph_engine.is_all_tasks_completed():
-                # テスト用の制限
-                if self._max_tasks and executed_count >= self._max_tasks:
-                    break
-                    
-                # 実行可能なタスクを取得
-                executable_tasks = self.graph_engine.get_executable_tasks()
-                
-                if not executable_tasks:
-                    # デッドロックまたは全タスク失敗
-                    failed_tasks = [
-                        t for t in self.graph_engine.tasks.values()
-                        if t.status == TaskStatus.FAILED
-                    ]
-                    if failed_tasks:
-                        error_msg = f"Cannot proceed: {len(failed_tasks)} tasks failed"
-                        logger.error(error_msg)
-                        if self.fail_fast:
-                            raise RuntimeError(error_msg)
+            while True:
+                # 空いている枠に実行可能なタスクを投入（失敗で停止する場合は新規投入しない）
+                if failure is None:
+                    for task in self.graph_engine.get_executable_tasks():
+                        if len(running) >= self.max_concurrent:
+                            break
+                        # テスト用の制限
+                        if self._max_tasks and launched_count >= self._max_tasks:
+                            break
+                        # 投入済みでまだ開始していないタスクはPENDINGのまま
+                        if task.id in running_ids:
+                            continue
+                            
+                        running[asyncio.create_task(self._execute_task({
+                            "id": task.id,
+                            "name": task.name,
+                            "prompt": self._get_task_prompt(task.id)
+                        }))] = task.id
+                        running_ids.add(task.id)
+                        launched_count += 1
+                        
+                if not running:
                     break
                     
-                # 並列実行
-                batch_results = await asyncio.gather(
-                    *[self._execute_task({
-                        "id": task.id,
-                        "name": task.name,
-                        "prompt": self._get_task_prompt(task.id)
-                    }) for task in executable_tasks],
-                    return_exceptions=True
-                )
+                # いずれかのタスクが完了したら、すぐに次のタスクを投入する
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
                 
-                # 結果を処理
-                for result in batch_results:
-                    if isinstance(result, Exception):
-                        logger.exception("Task execution failed with exception", exc_info=result)
-                        if self.fail_fast:
-                            raise result
+                # 結果を処理（同時に完了したタスクは投入順に記録する）
+                completed_results = []
+                for finished in [t for t in running if t in done]:
+                    running_ids.discard(running.pop(finished))
+                    error = finished.exception()
+                    if error is not None:
+                        logger.exception("Task execution failed with exception", exc_info=error)
+                        if self.fail_fast and failure is None:
+                            failure = error
                     else:
+                        result = finished.result()
                         self.results.append(result)
-                        executed_count += 1
+                        completed_results.append(result)
                         
                         # エラーチェック
-                        if not result.success and self.fail_fast:
-                            raise RuntimeError(f"Task {result.task_id} failed: {result.error}")
+                        if not result.success and self.fail_fast and failure is None:
+                            failure = RuntimeError(f"Task {result.task_id} failed: {result.error}")
                             
+                # 後続タスクを投入する前に、完了したタスクの結果をまとめて統合する
+                try:
+                    await self._integrate_task_results(completed_results)
+                except Exception as e:
+                    logger.exception("Failed to integrate task results")
+                    if self.fail_fast and failure is None:
+                        failure = e
+                        
                 # 進捗を更新
                 summary = self.graph_engine.get_progress_summary()
                 self._emit_progress("progress_update", summary=summary)
                 
+            # 実行中だったタスクの完了を待ってから失敗を通知
+            if failure is not None:
+                raise failure
+                
+            limit_reached = self._max_tasks and launched_count >= self._max_tasks
+            if not limit_reached and not self.graph_engine.is_all_tasks_completed():
+                # デッドロックまたは全タスク失敗
+                failed_tasks = [
+                    t for t in self.graph_engine.tasks.values()
+                    if t.status == TaskStatus.FAILED
+                ]
+                if failed_tasks:
+                    error_msg = f"Cannot proceed: {len(failed_tasks)} tasks failed"
+                    logger.error(error_msg)
+                    if self.fail_fast:
+                        raise RuntimeError(error_msg)
+                        
         finally:
+            # 外部からキャンセルされた場合などは実行中のタスクを止める
+            for pending in running:
+                pending.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+                
+            # 書き出し中の状態があれば完了を待ち、例外を回収する
+            if self._state_flush_task is not None:
+                try:
+                    await self._state_flush_task
+                except Exception as e:
+                    logger.error(f"Failed to save state: {e}")
+                self._state_flush_task = None
+                
             # 最終状態を保存
             self._save_state()
+            await self._flush_state()
             
         # 完了通知
         summary = self.graph_engine.get_progress_summary()
@@ -235,28 +332,56 @@ class Orchestrator:
         
         return self.results
         
-    def _get_task_prompt(self, task_id: str) -> str:
-        """タスクIDからプロンプトを取得（WBSから読み込む）"""
-        # 簡易実装：WBSファイルを再度読み込んでプロンプトを取得
-        import yaml
-        with open(self.wbs_path, 'r') as f:
-            wbs_data = yaml.safe_load(f)
+    async def _integrate_task_results(self, results: List[ExecutionResult]):
+        """成功したタスクの結果を共有ワークスペースにまとめて統合（ドライランでは何もしない）"""
+        if self.dry_run:
+            return
             
-        for phase in wbs_data.get('phases', []):
-            for task in phase.get('tasks', []):
-                if task['id'] == task_id:
-                    return task.get('prompt', f"Execute task: {task['name']}")
-                    
-        return f"Execute task: {task_id}"
+        batch = [
+            (result.task_id, result.workspace)
+            for result in results
+            if result.success and result.artifacts and result.workspace
+        ]
+        if not batch:
+            return
+            
+        integration_results = await self.artifact_manager.integrate_batch(
+            batch, conflict_resolver=self.conflict_resolver
+        )
+        for (task_id, _), integration_result in zip(batch, integration_results):
+            logger.info(f"Integrated task {task_id} results: "
+                      f"{integration_result['new']} new, "
+                      f"{integration_result['modified']} modified, "
+                      f"{integration_result.get('conflict', 0)} conflicts")
+        
+    @staticmethod
+    def _load_task_prompts(wbs_path: str) -> Dict[str, str]:
+        """WBSファイルを読み込み、タスクID -> プロンプトの辞書を作成"""
+        # TaskGraphEngineが解析済みの内容を再利用する
+        wbs_data = load_wbs(wbs_path)
+            
+        return {
+            task['id']: task.get('prompt', f"Execute task: {task['name']}")
+            for phase in wbs_data.get('phases', [])
+            for task in phase.get('tasks', [])
+        }
+        
+    def _get_task_prompt(self, task_id: str) -> str:
+        """タスクIDからプロンプトを取得（初期化時に読み込んだWBSから）"""
+        return self._task_prompts.get(task_id, f"Execute task: {task_id}")
         
     def get_status_report(self) -> Dict[str, Any]:
         """現在の実行状況レポートを生成"""
         summary = self.graph_engine.get_progress_summary()
         
-        # タスクごとの詳細
+        # タスクごとの詳細（同じタスクの結果が複数あれば最初のものを使う）
+        results_by_id = {}
+        for r in self.results:
+            results_by_id.setdefault(r.task_id, r)
+            
         task_details = []
         for task_id, task in self.graph_engine.tasks.items():
-            result = next((r for r in self.results if r.task_id == task_id), None)
+            result = results_by_id.get(task_id)
             
             detail = {
                 "id": task_id,
@@ -287,10 +412,8 @@ class Orchestrator:
         
         logger.info("Starting artifact integration...")
         
-        # 各タスクの成果物をコピー
-        copied_files = []
-        versioned_files = []
-        
+        # 統合先のファイル名ごとにまとめる（同名のファイルは競合判定のため順番に処理する）
+        groups: Dict[str, List[Tuple[Path, str]]] = {}
         for result in self.results:
             if result.success and result.artifacts:
                 task_dir = self.workspace_dir / result.task_id
@@ -302,20 +425,23 @@ class Orchestrator:
                         
                     source_file = task_dir / artifact
                     if source_file.exists():
-                        # ArtifactManagerを使用して統合（競合時はClaude Codeでマージを試みる）
-                        actual_path = await self.artifact_manager.integrate_artifact(
-                            source_path=source_file,
-                            dest_dir=integrated_dir,
-                            task_id=result.task_id,
-                            conflict_resolver=self.conflict_resolver
-                        )
-                        
-                        # 実際に保存されたファイル名を記録
-                        actual_name = actual_path.name
-                        if actual_name != source_file.name:
-                            versioned_files.append(f"{source_file.name} -> {actual_name}")
-                        
-                        copied_files.append(str(actual_name))
+                        groups.setdefault(source_file.name, []).append((source_file, result.task_id))
+        
+        # 異なるファイル名のグループは並行して統合する
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        group_results = await asyncio.gather(*[
+            self._integrate_group(pairs, integrated_dir, semaphore)
+            for pairs in groups.values()
+        ])
+        
+        copied_files = []
+        versioned_files = []
+        for integrated in group_results:
+            for source_name, actual_name in integrated:
+                # 実際に保存されたファイル名を記録
+                if actual_name != source_name:
+                    versioned_files.append(f"{source_name} -> {actual_name}")
+                copied_files.append(actual_name)
         
         if copied_files:
             logger.info(f"Integration completed. {len(copied_files)} files integrated to {integrated_dir}")
@@ -346,3 +472,27 @@ This directory contains all artifacts generated by the AI-driven project executi
         else:
             logger.warning("No artifacts found to integrate")
             
+    
+    async def _integrate_group(
+        self,
+        pairs: List[Tuple[Path, str]],
+        integrated_dir: Path,
+        semaphore: asyncio.Semaphore
+    ) -> List[Tuple[str, str]]:
+        """同じファイル名の成果物を順番に統合する
+        
+        Returns:
+            (元のファイル名, 実際に保存されたファイル名) のリスト
+        """
+        integrated = []
+        for source_file, task_id in pairs:
+            async with semaphore:
+                # ArtifactManagerを使用して統合（競合時はClaude Codeでマージを試みる）
+                actual_path = await self.artifact_manager.integrate_artifact(
+                    source_path=source_file,
+                    dest_dir=integrated_dir,
+                    task_id=task_id,
+                    conflict_resolver=self.conflict_resolver
+                )
+            integrated.append((source_file.name, actual_path.name))
+        return integrated
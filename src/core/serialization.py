@@ -0,0 +1,25 @@
+"""
+JSONシリアライズ
+orjsonがインストールされていれば使用し、なければ標準のjsonにフォールバックする
+"""
+import json
+
+try:
+    # orjsonはjsonより高速にシリアライズでき、bytesを直接出力する
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, indent: bool = False) -> bytes:
+    """JSONをbytesにシリアライズ（orjsonが使えれば使用）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+
+def loads(data: bytes):
+    """JSONをデシリアライズ（orjsonが使えれば使用）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
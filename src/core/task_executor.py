@@ -1,4 +1,6 @@
 import asyncio
+import functools
+import os
 import subprocess
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, TYPE_CHECKING
@@ -6,6 +8,7 @@ from pathlib import Path
 import json
 import shutil
 from datetime import datetime
+import time
 import logging
 import re
 
@@ -14,6 +17,63 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Claudeの標準出力の保存先（作業ディレクトリ名に付ける接尾辞）と、Claudeが内部状態を置くディレクトリ
+CLAUDE_OUTPUT_SUFFIX = ".claude_output.txt"
+CLAUDE_STATE_DIR = ".claude"
+
+# 一般的なHomebrewのclaudeのパス
+HOMEBREW_CLAUDE_PATH = "/opt/homebrew/bin/claude"
+
+# Markdownのコードブロックパターン
+# ```python filename.py または ```filename.py の形式を検出
+_CODE_BLOCK_RE = re.compile(r'```(?:[\w]+)?\s*(?:# )?(\S+\.[\w]+)?\n(.*?)```', re.DOTALL)
+
+# コードブロックがない出力を保存するときのファイル名の推測（出力に含まれる文字列 -> ファイル名）
+_OUTPUT_FILENAME_HINTS = (
+    ("models.py", "models.py"),
+    ("routes.py", "routes.py"),
+    ("main.py", "main.py"),
+)
+
+# Markdownの場合のファイル名の推測（小文字化した出力で判定）
+_MARKDOWN_FILENAME_HINTS = (
+    ("project_structure", "project_structure.md"),
+    ("api_spec", "api_spec.md"),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_claude_path() -> str:
+    """claudeコマンドのパスを取得"""
+    # 一般的なHomebrewのパスがあればフルパスを使用
+    if Path(HOMEBREW_CLAUDE_PATH).exists():
+        return HOMEBREW_CLAUDE_PATH
+    # Homebrewでない場合はPATHから探す
+    return "claude"
+
+
+async def _communicate_with_timeout(process: asyncio.subprocess.Process, timeout: float):
+    """タイムアウト付きでprocess.communicate()を待つ
+    
+    asyncio.timeout（Python 3.11+）は、wait_forのように内側を別タスクでラップしない。
+    
+    Raises:
+        asyncio.TimeoutError: タイムアウトした場合
+    """
+    if hasattr(asyncio, "timeout"):
+        async with asyncio.timeout(timeout):
+            return await process.communicate()
+    return await asyncio.wait_for(process.communicate(), timeout=timeout)
+
+
+def claude_output_path(task_dir: Path) -> Path:
+    """Claudeの標準出力の保存先を返す
+    
+    作業ディレクトリの中に置くと成果物として共有ワークスペースへ統合されてしまうため、
+    作業ディレクトリの隣（task_xxx.claude_output.txt）に保存する。
+    """
+    return task_dir.with_name(task_dir.name + CLAUDE_OUTPUT_SUFFIX)
+
 
 @dataclass
 class ExecutionResult:
@@ -26,6 +86,7 @@ class ExecutionResult:
     execution_time: float = 0.0
     timestamp: datetime = field(default_factory=datetime.now)
     workspace: Optional[Path] = None  # タスクのワークスペースパス
+    output_file: Optional[Path] = None  # Claudeの標準出力を保存したファイル
 
 
 class TaskExecutor:
@@ -35,55 +96,67 @@ class TaskExecutor:
         self.max_concurrent = max_concurrent
         self.timeout = timeout  # デフォルト1時間
         self._semaphore = asyncio.Semaphore(max_concurrent)
+        # claudeコマンドのパスはプロセス中変わらないため一度だけ解決する
+        self._claude_path = _resolve_claude_path()
         
     def _build_command(self, task: Dict) -> List[str]:
         """Claude実行コマンドを構築"""
-        # claudeコマンドのフルパスを使用
-        claude_path = "/opt/homebrew/bin/claude"  # 一般的なHomebrewのパス
-        if not Path(claude_path).exists():
-            # Homebrewでない場合は通常のパス
-            claude_path = "claude"
-            
         # --print オプションで非対話的に実行
         cmd = [
-            claude_path,
+            self._claude_path,
             "--print",
             task["prompt"]
         ]
         
         # 追加のオプションがあれば追加
-        if task.get("context_files"):
-            for file in task["context_files"]:
-                cmd.extend(["-f", file])
+        for file in task.get("context_files") or ():
+            cmd.extend(["-f", file])
                 
         return cmd
     
     
     def _collect_artifacts(self, task_dir: Path) -> List[str]:
-        """タスクディレクトリから生成物を収集"""
+        """タスクディレクトリから生成物を収集
+        
+        os.scandirのディレクトリエントリの種別を使うため、ファイルごとのstatが不要。
+        Claudeの内部状態を置く.claudeディレクトリは走査しない。
+        """
         artifacts = []
+        root = str(task_dir)
+        prefix_len = len(root) + 1
+        stack = [root]
         
-        for file_path in task_dir.rglob("*"):
-            if file_path.is_file():
-                relative_path = file_path.relative_to(task_dir)
-                artifacts.append(str(relative_path))
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != CLAUDE_STATE_DIR:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        artifacts.append(entry.path[prefix_len:])
                 
         return artifacts
     
-    async def execute(self, task: Dict, artifact_manager: Optional['ArtifactManager'] = None) -> ExecutionResult:
+    async def execute(self, task: Dict, artifact_manager: Optional['ArtifactManager'] = None,
+                      task_dir: Optional[Path] = None) -> ExecutionResult:
         """タスクを実行
         
         Args:
-            task: タスク定義
+            task: タスク定義（"timeout"を指定するとこのタスクだけタイムアウトを上書きする）
             artifact_manager: 共有コンテキスト機能を使用する場合のArtifactManager
+            task_dir: 共有コンテキストを使わずに実行する作業ディレクトリ（マージタスク用）。
+                指定した場合はartifact_managerより優先し、呼び出し側が用意したディレクトリで実行する
         """
         async with self._semaphore:  # 並列実行数を制限
             task_id = task["id"]
-            start_time = datetime.now()
+            timeout = task.get("timeout", self.timeout)
+            start_time = time.perf_counter()
             
             try:
-                # 作業ディレクトリを準備（常に共有コンテキストを使用）
-                if artifact_manager:
+                # 作業ディレクトリを準備（指定がなければ共有コンテキストを使用）
+                if task_dir is not None:
+                    task_dir.mkdir(parents=True, exist_ok=True)
+                elif artifact_manager:
                     task_dir = artifact_manager.prepare_task_workspace(task_id)
                     logger.info(f"Preparing workspace for task {task_id}")
                 else:
@@ -97,68 +170,69 @@ class TaskExecutor:
                 logger.debug(f"Command: {' '.join(cmd)}")
                 
                 # プロセスを実行
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    cwd=str(task_dir),
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
+                # 標準出力はメモリに溜めず作業ディレクトリの隣のファイルに直接書き込ませる（デバッグ用に必ず保存）
+                output_file = claude_output_path(task_dir)
+                with open(output_file, "wb") as stdout_file:
+                    process = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        cwd=str(task_dir),
+                        stdout=stdout_file,
+                        stderr=subprocess.PIPE
+                    )
                 
                 try:
                     # タイムアウト付きで実行
-                    stdout, stderr = await asyncio.wait_for(
-                        process.communicate(),
-                        timeout=self.timeout
-                    )
+                    _, stderr = await _communicate_with_timeout(process, timeout)
                     
                     # 実行結果を収集
-                    execution_time = (datetime.now() - start_time).total_seconds()
-                    artifacts = self._collect_artifacts(task_dir)
+                    execution_time = time.perf_counter() - start_time
                     
+                    # stdoutは必要になった場合のみ出力ファイルから読み込む
                     result = ExecutionResult(
                         task_id=task_id,
                         success=(process.returncode == 0),
-                        stdout=stdout.decode('utf-8', errors='replace'),
                         stderr=stderr.decode('utf-8', errors='replace'),
-                        artifacts=artifacts,
                         execution_time=execution_time,
-                        workspace=task_dir
+                        workspace=task_dir,
+                        output_file=output_file
                     )
                     
+                    # ファイルの読み書きや走査はイベントループを止めないようスレッドで行う
                     if process.returncode != 0:
+                        result.stdout = await asyncio.to_thread(self._read_output, output_file)
+                        result.artifacts = await asyncio.to_thread(self._collect_artifacts, task_dir)
                         result.error = f"Process exited with code {process.returncode}"
                         logger.error(f"Task {task_id} failed: {result.error}")
                         logger.error(f"stderr: {result.stderr}")
                         logger.error(f"stdout: {result.stdout}")
                     else:
                         logger.info(f"Task {task_id} completed successfully in {execution_time:.2f}s")
-                        
-                        # Claudeの標準出力を必ず保存（デバッグ用）
-                        output_file = task_dir / "claude_output.txt"
-                        output_file.write_text(result.stdout)
                         logger.debug(f"Saved Claude output to: {output_file}")
                         
-                        # 再度アーティファクトを収集（Claudeが作成したファイル）
-                        artifacts = self._collect_artifacts(task_dir)
+                        # アーティファクトを収集（Claudeが作成したファイル）
+                        artifacts = await asyncio.to_thread(self._collect_artifacts, task_dir)
                         result.artifacts = artifacts
                         
-                        # 実際のファイルが作成されているかチェック（.claude以外、claude_output.txt以外）
-                        real_files = [a for a in artifacts if '.claude' not in a and 'claude_output.txt' not in a]
-                        
-                        if real_files:
-                            logger.info(f"Claude created {len(real_files)} files: {real_files}")
+                        # 実際のファイルが作成されているかチェック（.claudeは走査対象外）
+                        if artifacts:
+                            logger.info(f"Claude created {len(artifacts)} files: {artifacts}")
                         else:
                             # 実際のファイルがない場合のみ、出力からファイルを抽出を試みる
                             logger.info("No files created by Claude, attempting to extract from output")
-                            self._extract_and_save_files(result.stdout, task_dir)
+                            result.stdout = await asyncio.to_thread(self._read_output, output_file)
+                            extracted = await asyncio.to_thread(
+                                self._extract_and_save_files, result.stdout, task_dir
+                            )
                             
-                            # 再度アーティファクトを収集
-                            artifacts = self._collect_artifacts(task_dir)
-                            result.artifacts = artifacts
-                            real_files = [a for a in artifacts if '.claude' not in a and 'claude_output.txt' not in a]
+                            # 書き込んだファイルを追加（ディレクトリを再走査しない）
+                            known = set(artifacts)
+                            for filename in extracted:
+                                if filename not in known:
+                                    known.add(filename)
+                                    artifacts.append(filename)
                             
-                            if real_files:
-                                logger.info(f"Extracted {len(real_files)} files from Claude output: {real_files}")
+                            if artifacts:
+                                logger.info(f"Extracted {len(artifacts)} files from Claude output: {artifacts}")
                             else:
                                 logger.warning(f"No files could be extracted from Claude output")
                         
@@ -167,20 +241,20 @@ class TaskExecutor:
                     process.kill()
                     await process.wait()
                     
-                    execution_time = (datetime.now() - start_time).total_seconds()
+                    execution_time = time.perf_counter() - start_time
                     
                     result = ExecutionResult(
                         task_id=task_id,
                         success=False,
-                        error=f"Task timeout after {self.timeout}s",
+                        error=f"Task timeout after {timeout}s",
                         execution_time=execution_time,
                         workspace=task_dir
                     )
-                    logger.error(f"Task {task_id} timed out after {self.timeout}s")
+                    logger.error(f"Task {task_id} timed out after {timeout}s")
                     
             except Exception as e:
                 # その他のエラー
-                execution_time = (datetime.now() - start_time).total_seconds()
+                execution_time = time.perf_counter() - start_time
                 
                 result = ExecutionResult(
                     task_id=task_id,
@@ -196,82 +270,108 @@ class TaskExecutor:
         """複数のタスクをバッチ実行"""
         logger.info(f"Starting batch execution of {len(tasks)} tasks")
         
-        # 全タスクを並列実行（max_concurrentで制限）
-        results = await asyncio.gather(
-            *[self.execute(task) for task in tasks],
-            return_exceptions=True
-        )
+        # max_concurrent個のワーカーがタスクを順に取り出して実行する
+        # （コルーチンは実行する時点で生成するため、同時に存在するのはワーカー数まで）
+        final_results: List[Optional[ExecutionResult]] = [None] * len(tasks)
+        pending = iter(enumerate(tasks))
         
-        # 例外をExecutionResultに変換
-        final_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                final_results.append(
-                    ExecutionResult(
-                        task_id=tasks[i]["id"],
+        async def worker():
+            for i, task in pending:
+                try:
+                    final_results[i] = await self.execute(task)
+                except Exception as e:
+                    # 例外をExecutionResultに変換
+                    final_results[i] = ExecutionResult(
+                        task_id=task["id"],
                         success=False,
-                        error=str(result)
+                        error=str(e)
                     )
-                )
-            else:
-                final_results.append(result)
+        
+        await asyncio.gather(*[worker() for _ in range(min(self.max_concurrent, len(tasks)))])
                 
         successful = sum(1 for r in final_results if r.success)
         logger.info(f"Batch execution completed: {successful}/{len(tasks)} tasks succeeded")
         
         return final_results
     
-    def cleanup_workspace(self, task_id: Optional[str] = None):
-        """作業ディレクトリをクリーンアップ"""
+    async def cleanup_workspace(self, task_id: Optional[str] = None):
+        """作業ディレクトリをクリーンアップ
+        
+        大きなディレクトリの削除でイベントループをブロックしないよう、スレッドで実行する
+        """
         if task_id:
             task_dir = self.workspace_dir / task_id
             if task_dir.exists():
-                shutil.rmtree(task_dir)
+                await asyncio.to_thread(shutil.rmtree, task_dir)
                 logger.info(f"Cleaned up workspace for task {task_id}")
+            claude_output_path(task_dir).unlink(missing_ok=True)
         else:
             # 全体をクリーンアップ
             if self.workspace_dir.exists():
-                shutil.rmtree(self.workspace_dir)
+                await asyncio.to_thread(shutil.rmtree, self.workspace_dir)
                 self.workspace_dir.mkdir()
                 logger.info("Cleaned up entire workspace")
     
-    def _extract_and_save_files(self, stdout: str, task_dir: Path):
-        """標準出力からコードブロックを抽出してファイルに保存"""
-        # Markdownのコードブロックパターン
-        # ```python filename.py または ```filename.py の形式を検出
-        code_block_pattern = r'```(?:[\w]+)?\s*(?:# )?(\S+\.[\w]+)?\n(.*?)```'
+    @staticmethod
+    def _read_output(output_file: Path) -> str:
+        """保存された標準出力を読み込む
+        
+        テキストモードで逐次デコードし、bytesとstrを同時に保持しない
+        """
+        with open(output_file, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            return f.read()
+    
+    def _extract_and_save_files(self, stdout: str, task_dir: Path) -> List[str]:
+        """標準出力からコードブロックを抽出してファイルに保存
         
-        matches = re.findall(code_block_pattern, stdout, re.DOTALL)
+        Returns:
+            保存したファイルのtask_dirからの相対パス
+        """
+        saved = []
+        found_block = False
+        # 同じディレクトリへのmkdirを繰り返さない
+        made_dirs = set()
+        root = task_dir.resolve()
         
-        for filename, content in matches:
+        for match in _CODE_BLOCK_RE.finditer(stdout):
+            found_block = True
+            filename, content = match.group(1), match.group(2)
             if filename:
-                # ファイル名が指定されている場合
-                file_path = task_dir / filename
-                file_path.parent.mkdir(parents=True, exist_ok=True)
+                # ファイル名が指定されている場合（絶対パスや..でtask_dirの外を指すものは保存しない）
+                file_path = (root / filename).resolve()
+                try:
+                    relative = file_path.relative_to(root)
+                except ValueError:
+                    logger.warning(f"Skipped file outside the task workspace: {filename}")
+                    continue
+                if file_path.parent not in made_dirs:
+                    file_path.parent.mkdir(parents=True, exist_ok=True)
+                    made_dirs.add(file_path.parent)
                 file_path.write_text(content.strip())
+                saved.append(str(relative))
                 logger.info(f"Saved file: {file_path}")
         
         # ファイル名なしのコードブロックも検出（最初に見つかったものを推測）
-        if not matches:
-            # プロンプトからファイル名を推測
-            if "models.py" in stdout:
-                filename = "models.py"
-            elif "routes.py" in stdout:
-                filename = "routes.py"
-            elif "main.py" in stdout:
-                filename = "main.py"
-            elif ".md" in stdout:
-                # Markdownファイルの推測
-                if "project_structure" in stdout.lower():
-                    filename = "project_structure.md"
-                elif "api_spec" in stdout.lower():
-                    filename = "api_spec.md"
+        if not found_block:
+            # プロンプトからファイル名を推測（最初に見つかったものを採用）
+            filename = next(
+                (name for needle, name in _OUTPUT_FILENAME_HINTS if needle in stdout), None
+            )
+            if filename is None:
+                if ".md" in stdout:
+                    # Markdownファイルの推測（小文字化は1回だけ）
+                    lowered = stdout.lower()
+                    filename = next(
+                        (name for needle, name in _MARKDOWN_FILENAME_HINTS if needle in lowered),
+                        "output.md"
+                    )
                 else:
-                    filename = "output.md"
-            else:
-                filename = "output.txt"
+                    filename = "output.txt"
             
             # 既存ファイルを上書きしないように、extracted_プレフィックスを付ける
             file_path = task_dir / f"extracted_{filename}"
             file_path.write_text(stdout)
-            logger.info(f"Saved entire output to: {file_path}")
\ No newline at end of file
+            saved.append(file_path.name)
+            logger.info(f"Saved entire output to: {file_path}")
+        
+        return saved
\ No newline at end of file
@@ -1,10 +1,42 @@
+from collections import deque
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import List, Dict, Set, Optional
-import yaml
+from functools import lru_cache
+from typing import Any, List, Dict, Set, Optional, Union
+import os
+import sys
 from pathlib import Path
 
 
+def load_wbs(wbs_path: str) -> Dict[str, Any]:
+    """WBSファイルを読み込む
+    
+    同じファイルはTaskGraphEngineとOrchestratorの両方から読まれるため、
+    (パス, mtime_ns, サイズ) をキーに解析結果をキャッシュする。
+    返す辞書は共有されるため、呼び出し側で変更しないこと。
+    """
+    stat = os.stat(wbs_path)
+    return _parse_wbs(os.path.abspath(wbs_path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def _parse_wbs(wbs_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """WBSファイルを解析（mtime_nsとsizeはキャッシュキーとしてのみ使用）"""
+    # yamlの読み込みには約20msかかるため、ファイルを解析するときまで遅らせる
+    # （解析済みのWBSからグラフを作る場合やWBSを使わないコマンドでは不要）
+    import yaml
+    
+    # libyamlがあればCローダーで高速に読み込む
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(wbs_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=loader) or {}
+
+
+def _intern(value: Any) -> Any:
+    """文字列ならinternして返す（WBSのIDは数値で書かれることもある）"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 class TaskStatus(Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
@@ -12,7 +44,12 @@ class TaskStatus(Enum):
     FAILED = "failed"
 
 
-@dataclass
+# Python 3.10以降はdataclassに__slots__を生成させ、タスクごとの__dict__をなくす
+# （3.9ではフィールドのデフォルト値と__slots__を併用できないため通常のクラスのまま）
+_TASK_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_TASK_DATACLASS_OPTIONS)
 class Task:
     id: str
     name: str
@@ -22,57 +59,150 @@ class Task:
 
 
 class TaskGraphEngine:
-    def __init__(self, wbs_path: str):
+    def __init__(self, wbs: Union[str, Dict[str, Any]]):
+        """WBSからタスクグラフを構築
+        
+        Args:
+            wbs: WBSファイルのパス、または解析済みのWBS（ファイルを介さずにグラフを作る場合）
+        """
         self.tasks: Dict[str, Task] = {}
         self.phase_dependencies: Dict[str, str] = {}  # phase_id -> depends_on_phase
-        self._load_wbs(wbs_path)
+        self._successors: Dict[str, List[str]] = {}  # task_id -> このタスクに依存するタスク
+        self._topo_order: List[str] = []
+        self._phase_tasks: Dict[str, List[Task]] = {}  # phase_id -> フェーズのタスク
+        self._phase_incomplete: Dict[str, int] = {}  # phase_id -> 未完了のタスク数
+        self._status_counts: Dict[TaskStatus, int] = {}  # ステータス -> タスク数
+        self._load_wbs(wbs)
         self._validate_dependencies()
+        self._init_ready_set()
     
-    def _load_wbs(self, wbs_path: str):
-        """WBSファイルからタスクグラフを構築"""
-        with open(wbs_path, 'r', encoding='utf-8') as f:
-            wbs_data = yaml.safe_load(f)
+    def _load_wbs(self, wbs: Union[str, Dict[str, Any]]):
+        """WBSを読み込んでタスクとフェーズを登録"""
+        wbs_data = wbs if isinstance(wbs, dict) else load_wbs(wbs)
         
+        # タスクIDは辞書のキー・依存リスト・逆引きに繰り返し現れるため、
+        # internして同じオブジェクトを共有する（辞書の検索が同一性の比較で済む）
         for phase in wbs_data.get('phases', []):
-            phase_id = phase['id']
+            phase_id = _intern(phase['id'])
             
             # フェーズ間依存を記録
             if 'depends_on_phase' in phase:
-                self.phase_dependencies[phase_id] = phase['depends_on_phase']
+                self.phase_dependencies[phase_id] = _intern(phase['depends_on_phase'])
             
             # タスクを読み込み
             for task_data in phase.get('tasks', []):
                 task = Task(
-                    id=task_data['id'],
+                    id=_intern(task_data['id']),
                     name=task_data['name'],
-                    dependencies=task_data.get('dependencies', []),
+                    dependencies=[_intern(dep_id) for dep_id in task_data.get('dependencies', [])],
                     phase_id=phase_id
                 )
                 self.tasks[task.id] = task
+                
+        # フェーズごとのタスク（同じIDのタスクが再定義された場合は後のものを使う）
+        for task in self.tasks.values():
+            self._phase_tasks.setdefault(task.phase_id, []).append(task)
+        
+        # 依存関係の逆引き（WBSに存在しない依存先は無視する）
+        self._successors = {task_id: [] for task_id in self.tasks}
+        for task in self.tasks.values():
+            for dep_id in task.dependencies:
+                if dep_id in self._successors:
+                    self._successors[dep_id].append(task.id)
     
     def _validate_dependencies(self):
-        """循環依存のチェック"""
-        def has_cycle(task_id: str, visited: Set[str], rec_stack: Set[str]) -> bool:
-            visited.add(task_id)
-            rec_stack.add(task_id)
+        """循環依存のチェック（Kahnのアルゴリズムによるトポロジカルソート）
+        
+        再帰を使わないため、依存の深いWBSでも再帰上限に達しない。
+        求めたトポロジカル順序は_topo_orderに保持する。
+        """
+        in_degree = {
+            task_id: sum(1 for dep_id in task.dependencies if dep_id in self.tasks)
+            for task_id, task in self.tasks.items()
+        }
+        queue = deque(task_id for task_id, degree in in_degree.items() if degree == 0)
+        order = []
+        
+        while queue:
+            task_id = queue.popleft()
+            order.append(task_id)
+            for successor in self._successors[task_id]:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    queue.append(successor)
+        
+        if len(order) != len(self.tasks):
+            raise ValueError(
+                f"Circular dependency detected involving task {self._find_cycle_member(in_degree)}"
+            )
             
-            task = self.tasks.get(task_id)
-            if task:
-                for dep_id in task.dependencies:
-                    if dep_id not in visited:
-                        if has_cycle(dep_id, visited, rec_stack):
-                            return True
-                    elif dep_id in rec_stack:
-                        return True
+        self._topo_order = order
+    
+    def _init_ready_set(self):
+        """実行可能なタスクの集合を初期化
+        
+        以降はupdate_task_statusで、状態が変わったタスクとその後続タスク（およびフェーズ）
+        だけを再評価する。get_executable_tasksは全タスクを走査しない。
+        """
+        self._task_index = {task_id: index for index, task_id in enumerate(self.tasks)}
+        
+        # フェーズの逆引き（phase_id -> このフェーズに依存するフェーズ）
+        self._phase_dependents: Dict[str, List[str]] = {}
+        for phase_id, depends_on in self.phase_dependencies.items():
+            self._phase_dependents.setdefault(depends_on, []).append(phase_id)
             
-            rec_stack.remove(task_id)
-            return False
+        self._recount()
+    
+    def _recount(self):
+        """現在のステータスから集計値と実行可能なタスクの集合を作り直す"""
+        # ステータスごとのタスク数（update_task_statusで増減させる）
+        self._status_counts = {status: 0 for status in TaskStatus}
+        for task in self.tasks.values():
+            self._status_counts[task.status] += 1
+        
+        # フェーズごとの未完了のタスク数
+        self._phase_incomplete = {
+            phase_id: sum(1 for task in tasks if task.status != TaskStatus.COMPLETED)
+            for phase_id, tasks in self._phase_tasks.items()
+        }
         
-        visited = set()
+        # 未完了の依存タスク数（依存先の重複もsuccessorsと同じく数える）
+        self._unmet_deps = {
+            task_id: sum(
+                1 for dep_id in task.dependencies
+                if dep_id in self.tasks and self.tasks[dep_id].status != TaskStatus.COMPLETED
+            )
+            for task_id, task in self.tasks.items()
+        }
+        
+        self._ready: Set[str] = set()
         for task_id in self.tasks:
-            if task_id not in visited:
-                if has_cycle(task_id, visited, set()):
-                    raise ValueError(f"Circular dependency detected involving task {task_id}")
+            self._refresh_ready(task_id)
+    
+    def _refresh_ready(self, task_id: str):
+        """タスクが実行可能かを再評価して集合を更新"""
+        task = self.tasks[task_id]
+        if (task.status == TaskStatus.PENDING
+                and self._unmet_deps[task_id] == 0
+                and (not task.phase_id or self._is_phase_ready(task.phase_id))):
+            self._ready.add(task_id)
+        else:
+            self._ready.discard(task_id)
+    
+    def _find_cycle_member(self, in_degree: Dict[str, int]) -> str:
+        """ソートで残ったタスクから、循環の上にあるタスクを1つ探す
+        
+        残ったタスクは必ず残った依存先を持つため、依存をたどると循環に入る
+        """
+        remaining = {task_id for task_id, degree in in_degree.items() if degree > 0}
+        task_id = next(task_id for task_id in self.tasks if task_id in remaining)
+        seen: Set[str] = set()
+        while task_id not in seen:
+            seen.add(task_id)
+            task_id = next(
+                dep_id for dep_id in self.tasks[task_id].dependencies if dep_id in remaining
+            )
+        return task_id
     
     def _is_phase_ready(self, phase_id: str) -> bool:
         """フェーズが実行可能かチェック"""
@@ -80,44 +210,59 @@ class TaskGraphEngine:
             return True
         
         depends_on = self.phase_dependencies[phase_id]
-        # 依存フェーズの全タスクが完了しているか
-        for task in self.tasks.values():
-            if task.phase_id == depends_on and task.status != TaskStatus.COMPLETED:
-                return False
-        return True
+        # 依存フェーズの全タスクが完了しているか（未完了数はupdate_task_statusで更新）
+        return self._phase_incomplete.get(depends_on, 0) == 0
     
     def get_executable_tasks(self) -> List[Task]:
-        """現在実行可能なタスクのリストを返す"""
-        executable = []
-        
-        for task in self.tasks.values():
-            # すでに実行中または完了済みはスキップ
-            if task.status != TaskStatus.PENDING:
-                continue
-            
-            # フェーズが準備できていない場合はスキップ
-            if task.phase_id and not self._is_phase_ready(task.phase_id):
-                continue
-            
-            # 全ての依存タスクが完了しているかチェック
-            all_deps_completed = all(
-                self.tasks[dep_id].status == TaskStatus.COMPLETED
-                for dep_id in task.dependencies
-                if dep_id in self.tasks
-            )
-            
-            if all_deps_completed:
-                executable.append(task)
-        
-        return executable
+        """現在実行可能なタスクのリストを返す（WBSでの定義順）"""
+        return [
+            self.tasks[task_id]
+            for task_id in sorted(self._ready, key=self._task_index.__getitem__)
+        ]
     
     def update_task_status(self, task_id: str, status: TaskStatus):
         """タスクのステータスを更新"""
         if task_id in self.tasks:
-            self.tasks[task_id].status = status
+            task = self.tasks[task_id]
+            was_completed = task.status == TaskStatus.COMPLETED
+            self._status_counts[task.status] -= 1
+            self._status_counts[status] += 1
+            task.status = status
+            
+            # 完了状態が変わった場合は、後続タスクとフェーズの状態を更新
+            is_completed = status == TaskStatus.COMPLETED
+            if was_completed != is_completed:
+                delta = -1 if is_completed else 1
+                for successor in self._successors[task_id]:
+                    self._unmet_deps[successor] += delta
+                    self._refresh_ready(successor)
+                    
+                self._phase_incomplete[task.phase_id] += delta
+                # フェーズの準備状態が切り替わった場合は、依存するフェーズのタスクを再評価
+                remaining = self._phase_incomplete[task.phase_id]
+                if remaining == 0 or (remaining == 1 and not is_completed):
+                    for dependent_phase in self._phase_dependents.get(task.phase_id, ()):
+                        for phase_task in self._phase_tasks.get(dependent_phase, ()):
+                            self._refresh_ready(phase_task.id)
+                            
+            self._refresh_ready(task_id)
         else:
             raise ValueError(f"Task {task_id} not found")
     
+    def update_task_statuses(self, updates: Dict[str, TaskStatus]):
+        """複数のタスクのステータスをまとめて更新
+        
+        保存された状態の復元のように多数のタスクを一度に更新する場合に使う。
+        タスクごとに後続タスクやフェーズを再評価せず、最後に一度だけ集計し直す。
+        """
+        for task_id in updates:
+            if task_id not in self.tasks:
+                raise ValueError(f"Task {task_id} not found")
+        
+        for task_id, status in updates.items():
+            self.tasks[task_id].status = status
+        self._recount()
+    
     def get_task_status(self, task_id: str) -> TaskStatus:
         """タスクのステータスを取得"""
         if task_id in self.tasks:
@@ -127,29 +272,11 @@ class TaskGraphEngine:
     
     def is_all_tasks_completed(self) -> bool:
         """全てのタスクが完了したかチェック"""
-        return all(
-            task.status == TaskStatus.COMPLETED
-            for task in self.tasks.values()
-        )
+        return self._status_counts[TaskStatus.COMPLETED] == len(self.tasks)
     
     def get_progress_summary(self) -> Dict[str, int]:
-        """進捗のサマリーを取得"""
-        summary = {
-            "total": len(self.tasks),
-            "pending": 0,
-            "in_progress": 0,
-            "completed": 0,
-            "failed": 0
-        }
-        
-        for task in self.tasks.values():
-            if task.status == TaskStatus.PENDING:
-                summary["pending"] += 1
-            elif task.status == TaskStatus.IN_PROGRESS:
-                summary["in_progress"] += 1
-            elif task.status == TaskStatus.COMPLETED:
-                summary["completed"] += 1
-            elif task.status == TaskStatus.FAILED:
-                summary["failed"] += 1
-        
+        """進捗のサマリーを取得（全タスクは走査せず、保持しているタスク数から作る）"""
+        summary = {"total": len(self.tasks)}
+        for status, count in self._status_counts.items():
+            summary[status.value] = count
         return summary
\ No newline at end of file
@@ -4,6 +4,8 @@ Claude Codeを使って要求文からproject.yamlを生成
 """
 import asyncio
 import logging
+import os
+import shutil
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
@@ -65,9 +67,13 @@ class WBSGenerator:
         
         if not generated_file.exists():
             # project.yamlが見つからない場合、他のYAMLファイルを探す
-            yaml_files = list((self.workspace_dir / task_id).glob("*.yaml"))
+            # （実行時に収集済みの生成物一覧を使い、ディレクトリを再走査しない）
+            yaml_files = sorted(
+                a for a in result.artifacts
+                if a.endswith(".yaml") and os.sep not in a
+            )
             if yaml_files:
-                generated_file = yaml_files[0]
+                generated_file = self.workspace_dir / task_id / yaml_files[0]
                 logger.warning(f"Expected project.yaml but found {generated_file.name}")
             else:
                 raise RuntimeError("No YAML file was generated")
@@ -77,7 +83,6 @@ class WBSGenerator:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            import shutil
             shutil.copy2(generated_file, output_path)
             logger.info(f"WBS saved to: {output_path}")
             return output_path
@@ -119,7 +124,6 @@ phases:
     
     def cleanup(self):
         """作業ディレクトリをクリーンアップ"""
-        import shutil
         if self.workspace_dir.exists():
             shutil.rmtree(self.workspace_dir)
             logger.info("Cleaned up WBS workspace")
\ No newline at end of file
@@ -0,0 +1,37 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.core import orchestrator as orchestrator_module
+
+
+@pytest.fixture
+def mock_subprocess_exec(monkeypatch):
+    """Claude CLIのサブプロセス起動をモックする
+
+    返り値の関数で終了コード・標準出力（出力ファイルに書き込まれる内容）・
+    標準エラーを設定すると、生成されるモックプロセスを返す。
+    """
+    def install(returncode=0, stdout=b"", stderr=b""):
+        process = MagicMock()
+        process.returncode = returncode
+
+        async def communicate():
+            return (None, stderr)
+        process.communicate = communicate
+
+        async def create_subprocess_exec(*cmd, **kwargs):
+            # 標準出力は渡されたファイルに直接書き込まれる
+            kwargs["stdout"].write(stdout)
+            return process
+
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", create_subprocess_exec)
+        return process
+    return install
+
+
+@pytest.fixture
+def no_dry_run_delay(monkeypatch):
+    """ドライランの模擬実行時間を0にする（スケジューリングの検証には不要）"""
+    monkeypatch.setattr(orchestrator_module, "DRY_RUN_TASK_DELAY", 0)
@@ -1,34 +1,34 @@
 import pytest
 from pathlib import Path
-import tempfile
 import json
-from src.core.artifact_manager import ArtifactManager, TaskArtifacts
+import shutil
+from src.core import artifact_manager as artifact_manager_module
+from src.core.artifact_manager import ArtifactManager, TaskArtifacts, clone_file
 
 
 class TestArtifactManager:
     
     @pytest.fixture
-    def temp_workspace(self):
+    def temp_workspace(self, tmp_path):
         """テスト用の一時ワークスペースを作成"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            workspace = Path(tmpdir)
-            
-            # タスクディレクトリと成果物を作成
-            task1_dir = workspace / "task1"
-            task1_dir.mkdir()
-            (task1_dir / "models.py").write_text("# Task1 models")
-            (task1_dir / "utils.py").write_text("# Task1 utils")
-            
-            task2_dir = workspace / "task2"
-            task2_dir.mkdir()
-            (task2_dir / "routes.py").write_text("# Task2 routes")
-            (task2_dir / "models.py").write_text("# Task2 models")  # 競合ファイル
-            
-            task3_dir = workspace / "task3"
-            task3_dir.mkdir()
-            (task3_dir / "main.py").write_text("# Task3 main")
-            
-            yield workspace
+        workspace = tmp_path
+        
+        # タスクディレクトリと成果物を作成
+        task1_dir = workspace / "task1"
+        task1_dir.mkdir()
+        (task1_dir / "models.py").write_text("# Task1 models")
+        (task1_dir / "utils.py").write_text("# Task1 utils")
+        
+        task2_dir = workspace / "task2"
+        task2_dir.mkdir()
+        (task2_dir / "routes.py").write_text("# Task2 routes")
+        (task2_dir / "models.py").write_text("# Task2 models")  # 競合ファイル
+        
+        task3_dir = workspace / "task3"
+        task3_dir.mkdir()
+        (task3_dir / "main.py").write_text("# Task3 main")
+        
+        return workspace
     
     def test_register_task_artifacts(self, temp_workspace):
         """タスクの成果物登録をテスト"""
@@ -111,6 +111,93 @@ class TestArtifactManager:
         assert "routes.py" not in conflicts
         assert "main.py" not in conflicts
     
+    def test_reregister_does_not_duplicate_index(self, temp_workspace):
+        """同じタスクを再登録してもファイルインデックスが重複しないことをテスト"""
+        manager = ArtifactManager()
+        
+        manager.register_task_artifacts("task1", "Create Models", temp_workspace / "task1")
+        manager.register_task_artifacts("task1", "Create Models", temp_workspace / "task1")
+        
+        assert manager.get_tasks_by_file("models.py") == ["task1"]
+        assert manager.detect_file_conflicts() == {}
+    
+    def test_detect_file_conflicts_cache_invalidation(self, temp_workspace):
+        """競合検出の結果は再利用され、登録が変わると再計算されることをテスト"""
+        manager = ArtifactManager()
+        
+        manager.register_task_artifacts("task1", "Create Models", temp_workspace / "task1")
+        assert manager.detect_file_conflicts() == {}
+        
+        manager.register_task_artifacts("task2", "Create Routes", temp_workspace / "task2")
+        conflicts = manager.detect_file_conflicts()
+        assert conflicts == {"models.py": ["task1", "task2"]}
+        
+        # 返した結果を変更してもキャッシュには影響しない
+        conflicts["models.py"].append("task9")
+        assert manager.detect_file_conflicts() == {"models.py": ["task1", "task2"]}
+    
+    def test_reregister_removes_stale_index_entries(self, temp_workspace):
+        """再登録で消えたファイルはファイルインデックスから外れることをテスト"""
+        manager = ArtifactManager()
+        
+        manager.register_task_artifacts("task1", "Create Models", temp_workspace / "task1")
+        manager.register_task_artifacts("task2", "Create Routes", temp_workspace / "task2")
+        assert "models.py" in manager.detect_file_conflicts()
+        
+        (temp_workspace / "task1" / "models.py").unlink()
+        manager.register_task_artifacts("task1", "Create Models", temp_workspace / "task1")
+        
+        assert manager.get_tasks_by_file("models.py") == ["task2"]
+        assert manager.detect_file_conflicts() == {}
+    
+    def test_register_task_artifacts_batch(self, temp_workspace):
+        """複数タスクの一括登録が個別登録と同じ結果になることをテスト"""
+        manager = ArtifactManager()
+        
+        registered = manager.register_task_artifacts_batch([
+            ("task1", "Create Models", temp_workspace / "task1"),
+            ("task2", "Create Routes", temp_workspace / "task2"),
+            ("task3", "Create Main", temp_workspace / "task3"),
+        ])
+        
+        assert [ta.task_id for ta in registered] == ["task1", "task2", "task3"]
+        assert sorted(registered[0].get_files()) == ["models.py", "utils.py"]
+        assert sorted(registered[1].get_files()) == ["models.py", "routes.py"]
+        assert registered[2].get_files() == ["main.py"]
+        assert all(a.task_id == "task2" for a in registered[1].artifacts)
+        assert manager.detect_file_conflicts() == {"models.py": ["task1", "task2"]}
+    
+    def test_clone_file_with_clonefile(self, temp_workspace, monkeypatch):
+        """clonefile(2)が使える環境では一時名でクローンして置き換えることをテスト"""
+        calls = []
+        
+        def fake_clonefile(src, dst, flags):
+            calls.append(dst)
+            shutil.copy2(src, dst)
+            return 0
+        
+        monkeypatch.setattr(artifact_manager_module, "_clonefile", fake_clonefile)
+        src = temp_workspace / "task1" / "models.py"
+        dst = temp_workspace / "task2" / "models.py"
+        
+        # 既存のファイルも上書きされ、一時ファイルは残らない
+        clone_file(str(src), str(dst))
+        assert dst.read_text() == "# Task1 models"
+        assert len(calls) == 1
+        assert sorted(p.name for p in dst.parent.iterdir()) == ["models.py", "routes.py"]
+        
+        # clonefileが失敗した場合は通常のコピーにフォールバックする
+        monkeypatch.setattr(artifact_manager_module, "_clonefile", lambda src, dst, flags: -1)
+        clone_file(str(temp_workspace / "task3" / "main.py"), str(dst))
+        assert dst.read_text() == "# Task3 main"
+    
+    def test_parallel_map_preserves_order(self):
+        """まとめて渡した場合も入力順で結果が返ることをテスト"""
+        items = list(range(1000))
+        
+        assert ArtifactManager._parallel_map(lambda x: x * 2, items) == [x * 2 for x in items]
+        assert ArtifactManager._parallel_map(lambda x: x * 2, items[:3]) == [0, 2, 4]
+    
     def test_get_dependencies_artifacts(self, temp_workspace):
         """依存タスクの成果物取得をテスト"""
         manager = ArtifactManager()
@@ -159,79 +246,117 @@ class TestArtifactManager:
         files = task1_artifacts.get_files()
         assert "models.py" in files
         assert "utils.py" in files
+        
+        # 復元した成果物は同じタスクIDの文字列を共有する
+        task_ids = {id(a.task_id) for a in task1_artifacts.artifacts}
+        assert task_ids == {id(task1_artifacts.task_id)}
     
-    def test_empty_task_directory(self):
+    def test_persistence_with_journal(self, temp_workspace):
+        """ジャーナル追記分も含めて復元できることをテスト"""
+        registry_file = temp_workspace / "artifact_registry.json"
+        journal_file = registry_file.with_suffix(".jsonl")
+        
+        manager1 = ArtifactManager(storage_path=registry_file)
+        manager1.register_task_artifacts("task1", "Create Models", temp_workspace / "task1")
+        # 2件目以降はジャーナルに追記される
+        manager1.register_task_artifacts("task2", "Create Routes", temp_workspace / "task2")
+        assert journal_file.exists()
+        
+        manager2 = ArtifactManager(storage_path=registry_file)
+        assert set(manager2.registry) == {"task1", "task2"}
+        assert set(manager2.get_tasks_by_file("models.py")) == {"task1", "task2"}
+        
+        # コンパクション後はジャーナルが削除され、本体だけで復元できる
+        manager2.compact()
+        assert not journal_file.exists()
+        
+        manager3 = ArtifactManager(storage_path=registry_file)
+        assert set(manager3.registry) == {"task1", "task2"}
+        assert set(manager3.get_tasks_by_file("models.py")) == {"task1", "task2"}
+    
+    def test_empty_task_directory(self, tmp_path):
         """空のタスクディレクトリの処理をテスト"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            workspace = Path(tmpdir)
-            empty_dir = workspace / "empty_task"
-            empty_dir.mkdir()
-            
-            manager = ArtifactManager()
-            artifacts = manager.register_task_artifacts(
-                "empty_task", "Empty Task", empty_dir
-            )
-            
-            assert artifacts.task_id == "empty_task"
-            assert artifacts.task_name == "Empty Task"
-            assert len(artifacts.artifacts) == 0
-    
-    def test_nested_files(self):
+        workspace = tmp_path
+        empty_dir = workspace / "empty_task"
+        empty_dir.mkdir()
+        
+        manager = ArtifactManager()
+        artifacts = manager.register_task_artifacts(
+            "empty_task", "Empty Task", empty_dir
+        )
+        
+        assert artifacts.task_id == "empty_task"
+        assert artifacts.task_name == "Empty Task"
+        assert len(artifacts.artifacts) == 0
+    
+    def test_nested_files(self, tmp_path):
         """ネストされたディレクトリ構造の処理をテスト"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            workspace = Path(tmpdir)
-            task_dir = workspace / "nested_task"
-            task_dir.mkdir()
-            
-            # ネストされたファイル構造を作成
-            (task_dir / "main.py").write_text("# Main")
-            subdir = task_dir / "submodule"
-            subdir.mkdir()
-            (subdir / "helper.py").write_text("# Helper")
-            
-            manager = ArtifactManager()
-            artifacts = manager.register_task_artifacts(
-                "nested_task", "Nested Task", task_dir
-            )
-            
-            # rglob使用により、ネストされたファイルも含まれる
-            assert len(artifacts.artifacts) == 2
-            files = artifacts.get_files()
-            assert "main.py" in files
-            assert "helper.py" in files
-    
-    def test_base_file_saving(self):
+        workspace = tmp_path
+        task_dir = workspace / "nested_task"
+        task_dir.mkdir()
+        
+        # ネストされたファイル構造を作成
+        (task_dir / "main.py").write_text("# Main")
+        subdir = task_dir / "submodule"
+        subdir.mkdir()
+        (subdir / "helper.py").write_text("# Helper")
+        
+        manager = ArtifactManager()
+        artifacts = manager.register_task_artifacts(
+            "nested_task", "Nested Task", task_dir
+        )
+        
+        # rglob使用により、ネストされたファイルも含まれる
+        assert len(artifacts.artifacts) == 2
+        files = artifacts.get_files()
+        assert "main.py" in files
+        assert "helper.py" in files
+    
+    def test_excluded_directories(self, tmp_path):
+        """除外ディレクトリ配下のファイルが登録されないことをテスト"""
+        task_dir = tmp_path / "task"
+        (task_dir / ".claude").mkdir(parents=True)
+        (task_dir / ".claude" / "settings.json").write_text("{}")
+        (task_dir / "pkg" / "__pycache__").mkdir(parents=True)
+        (task_dir / "pkg" / "__pycache__" / "mod.pyc").write_text("")
+        (task_dir / "pkg" / "mod.py").write_text("# Module")
+        (task_dir / ".gitignore").write_text("*.pyc")
+        
+        manager = ArtifactManager()
+        artifacts = manager.register_task_artifacts("task", "Task", task_dir)
+        
+        assert sorted(artifacts.get_files()) == [".gitignore", "mod.py"]
+    
+    def test_base_file_saving(self, tmp_path):
         """ベースファイルの保存と取得のテスト"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            workspace_dir = Path(tmpdir)
-            manager = ArtifactManager(workspace_dir=workspace_dir)
-            
-            # 共有ワークスペースにファイルを作成
-            shared_dir = workspace_dir / "shared"
-            shared_dir.mkdir(parents=True, exist_ok=True)
-            test_file = shared_dir / "test.py"
-            test_file.write_text("original content")
-            
-            # タスクワークスペースを準備
-            task_id = "test_task_1"
-            task_workspace = manager.prepare_task_workspace(task_id)
-            
-            # ベースファイルが保存されているか確認
-            base_file = manager._get_base_file(task_id, "test.py")
-            assert base_file is not None
-            assert base_file.exists()
-            assert base_file.read_text() == "original content"
-    
-    def test_base_file_not_saved_for_empty_workspace(self):
+        workspace_dir = tmp_path
+        manager = ArtifactManager(workspace_dir=workspace_dir)
+        
+        # 共有ワークスペースにファイルを作成
+        shared_dir = workspace_dir / "shared"
+        shared_dir.mkdir(parents=True, exist_ok=True)
+        test_file = shared_dir / "test.py"
+        test_file.write_text("original content")
+        
+        # タスクワークスペースを準備
+        task_id = "test_task_1"
+        task_workspace = manager.prepare_task_workspace(task_id)
+        
+        # ベースファイルが保存されているか確認
+        base_file = manager._get_base_file(task_id, "test.py")
+        assert base_file is not None
+        assert base_file.exists()
+        assert base_file.read_text() == "original content"
+    
+    def test_base_file_not_saved_for_empty_workspace(self, tmp_path):
         """空のワークスペースではベースファイルが保存されないことのテスト"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            workspace_dir = Path(tmpdir)
-            manager = ArtifactManager(workspace_dir=workspace_dir)
-            
-            # 空のワークスペースを準備
-            task_id = "test_task_empty"
-            task_workspace = manager.prepare_task_workspace(task_id)
-            
-            # ベースファイルディレクトリが作成されていないことを確認
-            base_dir = manager.base_snapshots_dir / task_id
-            assert not base_dir.exists()
\ No newline at end of file
+        workspace_dir = tmp_path
+        manager = ArtifactManager(workspace_dir=workspace_dir)
+        
+        # 空のワークスペースを準備
+        task_id = "test_task_empty"
+        task_workspace = manager.prepare_task_workspace(task_id)
+        
+        # ベースファイルディレクトリが作成されていないことを確認
+        base_dir = manager.base_snapshots_dir / task_id
+        assert not base_dir.exists()
\ No newline at end of file
@@ -3,9 +3,8 @@ ConflictResolverのテスト
 """
 import pytest
 import asyncio
+import subprocess
 from pathlib import Path
-import tempfile
-import shutil
 from unittest.mock import Mock, patch, AsyncMock
 
 from src.core.conflict_resolver import ConflictResolver, ConflictResolution
@@ -15,15 +14,33 @@ from src.core.task_executor import ExecutionResult
 class TestConflictResolver:
     """ConflictResolverのテストスイート"""
     
-    def setup_method(self):
-        """各テストの前処理"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.workspace_dir = Path(self.temp_dir)
+    @pytest.fixture(autouse=True)
+    def setup_workspace(self, tmp_path):
+        """各テストの前処理（一時ディレクトリの削除はpytestに任せる）"""
+        self.workspace_dir = tmp_path
         self.resolver = ConflictResolver(self.workspace_dir)
         
-    def teardown_method(self):
-        """各テストの後処理"""
-        shutil.rmtree(self.temp_dir)
+    def _fake_merge(self, outputs, stdout="Merge completed", check_task=None):
+        """マージタスクの実行を模擬するexecuteの代替を作成
+        
+        Args:
+            outputs: マージタスクのディレクトリに書き出すファイル名 -> 内容
+            stdout: 実行結果の標準出力
+            check_task: 渡されたタスク定義を検証する関数
+        """
+        async def execute(task_dict, artifact_manager=None, task_dir=None):
+            if check_task:
+                check_task(task_dict)
+            for filename, content in outputs.items():
+                (task_dir / filename).write_text(content)
+                
+            return ExecutionResult(
+                task_id=task_dict["id"],
+                success=True,
+                stdout=stdout,
+                artifacts=list(outputs)
+            )
+        return execute
         
     @pytest.mark.asyncio
     async def test_resolve_conflict_successful_merge(self):
@@ -38,21 +55,9 @@ class TestConflictResolver:
         # TaskExecutorをモック化
         with patch.object(self.resolver.executor, 'execute') as mock_execute:
             # マージタスクの実行をシミュレート
-            async def execute_merge(task_dict):
-                task_id = task_dict["id"]
-                merge_task_dir = self.resolver.merge_workspace / task_id
-                merge_task_dir.mkdir(parents=True)
-                merged_file = merge_task_dir / "test.py"
-                merged_file.write_text("# Merged version\ndef foo():\n    return 1  # from existing\n    return 2  # from new")
-                
-                return ExecutionResult(
-                    task_id=task_id,
-                    success=True,
-                    stdout="Merge completed",
-                    artifacts=["test.py"]
-                )
-            
-            mock_execute.side_effect = execute_merge
+            mock_execute.side_effect = self._fake_merge({
+                "test.py": "# Merged version\ndef foo():\n    return 1  # from existing\n    return 2  # from new"
+            })
             
             # マージを実行
             result = await self.resolver.resolve_conflict(existing_file, new_file, "task1")
@@ -75,21 +80,10 @@ class TestConflictResolver:
         # TaskExecutorをモック化
         with patch.object(self.resolver.executor, 'execute') as mock_execute:
             # マージタスクの実行をシミュレート
-            async def execute_cannot_merge(task_dict):
-                task_id = task_dict["id"]
-                merge_task_dir = self.resolver.merge_workspace / task_id
-                merge_task_dir.mkdir(parents=True)
-                cannot_merge_file = merge_task_dir / "CANNOT_MERGE.txt"
-                cannot_merge_file.write_text("Files are fundamentally incompatible")
-                
-                return ExecutionResult(
-                    task_id=task_id,
-                    success=True,
-                    stdout="Cannot merge",
-                    artifacts=["CANNOT_MERGE.txt"]
-                )
-            
-            mock_execute.side_effect = execute_cannot_merge
+            mock_execute.side_effect = self._fake_merge(
+                {"CANNOT_MERGE.txt": "Files are fundamentally incompatible"},
+                stdout="Cannot merge"
+            )
             
             # マージを実行
             result = await self.resolver.resolve_conflict(existing_file, new_file, "task1")
@@ -139,21 +133,10 @@ class TestConflictResolver:
         # TaskExecutorをモック化
         with patch.object(self.resolver.executor, 'execute') as mock_execute:
             # マージタスクの実行をシミュレート
-            async def execute_3way_merge(task_dict):
-                task_id = task_dict["id"]
-                merge_task_dir = self.resolver.merge_workspace / task_id
-                merge_task_dir.mkdir(parents=True)
-                merged_file = merge_task_dir / "shared.py"
-                merged_file.write_text("def foo():\n    return 1  # shared change\n    # task addition")
-                
-                return ExecutionResult(
-                    task_id=task_id,
-                    success=True,
-                    stdout="3-way merge completed",
-                    artifacts=["shared.py"]
-                )
-            
-            mock_execute.side_effect = execute_3way_merge
+            mock_execute.side_effect = self._fake_merge(
+                {"shared.py": "def foo():\n    return 1  # shared change\n    # task addition"},
+                stdout="3-way merge completed"
+            )
             
             # 3-wayマージを実行
             result = await self.resolver.resolve_three_way_conflict(
@@ -178,23 +161,14 @@ class TestConflictResolver:
         # TaskExecutorをモック化
         with patch.object(self.resolver.executor, 'execute') as mock_execute:
             # execute呼び出し時の引数を検証
-            async def check_prompt(task_dict):
-                prompt = task_dict["prompt"]
-                assert "# File did not exist in base version" in prompt
-                
-                merge_task_dir = self.resolver.merge_workspace / task_dict["id"]
-                merge_task_dir.mkdir(parents=True)
-                merged_file = merge_task_dir / "shared.py"
-                merged_file.write_text("merged without base")
+            def check_prompt(task_dict):
+                assert "# File did not exist in base version" in task_dict["prompt"]
                 
-                return ExecutionResult(
-                    task_id=task_dict["id"],
-                    success=True,
-                    stdout="Merged",
-                    artifacts=["shared.py"]
-                )
-            
-            mock_execute.side_effect = check_prompt
+            mock_execute.side_effect = self._fake_merge(
+                {"shared.py": "merged without base"},
+                stdout="Merged",
+                check_task=check_prompt
+            )
             
             # 3-wayマージを実行（ベースファイルなし）
             result = await self.resolver.resolve_three_way_conflict(
@@ -204,7 +178,160 @@ class TestConflictResolver:
             assert result.strategy == "merged"
             assert result.merged_file_path is not None
             
-    def test_create_merge_prompt(self):
+    @pytest.mark.asyncio
+    async def test_shared_executor_runs_in_merge_dir(self):
+        """共有executorでも、マージタスクは専用の空ディレクトリで実行されるテスト"""
+        executor = Mock()
+        resolver = ConflictResolver(self.workspace_dir, executor=executor)
+        assert resolver.executor is executor
+        
+        existing_file = self.workspace_dir / "test.py"
+        existing_file.write_text("def foo():\n    return 1")
+        
+        new_file = self.workspace_dir / "test_new.py"
+        new_file.write_text("def foo():\n    return 2")
+        
+        merge_dirs = []
+        
+        async def execute(task_dict, artifact_manager=None, task_dir=None):
+            # 共有コンテキストは使わず、空のディレクトリ（.claudeの設定のみ）が渡される
+            assert artifact_manager is None
+            assert task_dir.parent == resolver.merge_workspace
+            assert [p.name for p in task_dir.iterdir()] == [".claude"]
+            merge_dirs.append(task_dir)
+            (task_dir / "test.py").write_text("merged")
+            return ExecutionResult(task_id=task_dict["id"], success=True, workspace=task_dir)
+        
+        executor.execute = AsyncMock(side_effect=execute)
+        
+        result = await resolver.resolve_conflict(existing_file, new_file, "task1")
+        
+        assert result.strategy == "merged"
+        assert result.merged_file_path.read_text() == "merged"
+        # マージ結果を退避したら作業ディレクトリは削除される
+        assert not merge_dirs[0].exists()
+        assert executor.execute.call_args[0][0]["timeout"] == 300
+        
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_merges_are_coalesced(self):
+        """同じ内容の同時マージが1回の実行にまとめられるテスト"""
+        existing_file = self.workspace_dir / "test.py"
+        existing_file.write_text("def foo():\n    return 1")
+        
+        new_file = self.workspace_dir / "test_new.py"
+        new_file.write_text("def foo():\n    return 2")
+        
+        async def execute_merge(task_dict, artifact_manager=None, task_dir=None):
+            await asyncio.sleep(0.05)
+            (task_dir / "test.py").write_text("merged")
+            return ExecutionResult(task_id=task_dict["id"], success=True)
+            
+        with patch.object(self.resolver.executor, 'execute', side_effect=execute_merge) as mock_execute:
+            results = await asyncio.gather(
+                self.resolver.resolve_conflict(existing_file, new_file, "task1"),
+                self.resolver.resolve_conflict(existing_file, new_file, "task2")
+            )
+            
+            assert mock_execute.call_count == 1
+            
+        assert results[0] is results[1]
+        assert results[0].strategy == "merged"
+        assert not self.resolver._inflight
+        
+    @pytest.mark.asyncio
+    async def test_resolve_three_way_conflict_shared_unchanged(self):
+        """共有側がベースから変更されていない場合はタスク側を採用するテスト"""
+        base_file = self.workspace_dir / "base.py"
+        base_file.write_text("def foo():\n    return 1")
+        
+        shared_file = self.workspace_dir / "test.py"
+        shared_file.write_text("def foo():\n    return 1")
+        
+        task_file = self.workspace_dir / "task.py"
+        task_file.write_text("def foo():\n    return 2")
+        
+        with patch.object(self.resolver.executor, 'execute') as mock_execute:
+            result = await self.resolver.resolve_three_way_conflict(
+                base_file, shared_file, task_file, "task1"
+            )
+            
+            mock_execute.assert_not_called()
+            
+        assert result.strategy == "merged"
+        assert result.merged_file_path == task_file
+        
+    @pytest.mark.asyncio
+    async def test_resolve_conflict_identical_files(self):
+        """内容が同一の場合はClaudeを呼ばずに解決するテスト"""
+        existing_file = self.workspace_dir / "test.py"
+        existing_file.write_text("same content")
+        
+        new_file = self.workspace_dir / "test_new.py"
+        new_file.write_text("same content")
+        
+        with patch.object(self.resolver.executor, 'execute') as mock_execute:
+            result = await self.resolver.resolve_conflict(existing_file, new_file, "task1")
+            
+            mock_execute.assert_not_called()
+            
+        assert result.strategy == "merged"
+        assert result.merged_file_path.read_text() == "same content"
+        
+    @pytest.mark.asyncio
+    async def test_resolve_three_way_conflict_local_merge(self):
+        """変更が重ならない場合はClaudeを呼ばずにローカルでマージするテスト"""
+        base_file = self.workspace_dir / "base.py"
+        base_file.write_text("import os\n\ndef foo():\n    return 0\n")
+        
+        shared_file = self.workspace_dir / "shared.py"
+        shared_file.write_text("import os\nimport sys\n\ndef foo():\n    return 0\n")
+        
+        task_file = self.workspace_dir / "task.py"
+        task_file.write_text("import os\n\ndef foo():\n    return 1\n")
+        
+        with patch.object(self.resolver.executor, 'execute') as mock_execute:
+            result = await self.resolver.resolve_three_way_conflict(
+                base_file, shared_file, task_file, "task1"
+            )
+            
+            mock_execute.assert_not_called()
+            
+        assert result.strategy == "merged"
+        assert result.merged_file_path.name == "shared.py"
+        assert result.merged_file_path.read_text() == "import os\nimport sys\n\ndef foo():\n    return 1\n"
+            
+    @pytest.mark.parametrize("returncode, stdout, git_enabled, expected", [
+        (0, b"merged\n", True, "merged\n"),
+        (1, b"", True, None),
+        # usageエラーではgitを以降使わず、このファイルはdifflibでマージする
+        (129, b"", False, "shared\nb\ntask\n"),
+        # ファイル固有の失敗ではこのファイルだけ諦め、gitは使い続ける
+        (255, b"", True, None),
+    ])
+    def test_try_local_merge_git_exit_codes(self, returncode, stdout, git_enabled, expected):
+        """git merge-fileの終了コードに応じたローカルマージの振る舞いのテスト"""
+        base_file = self.workspace_dir / "base.py"
+        base_file.write_text("a\nb\nc\n")
+        shared_file = self.workspace_dir / "shared.py"
+        shared_file.write_text("shared\nb\nc\n")
+        task_file = self.workspace_dir / "task.py"
+        task_file.write_text("a\nb\ntask\n")
+        self.resolver._git_path = "git"
+        
+        completed = subprocess.CompletedProcess([], returncode, stdout=stdout, stderr=b"error")
+        with patch("src.core.local_merge.subprocess.run", return_value=completed) as mock_run:
+            resolution = self.resolver._try_local_merge(base_file, shared_file, task_file, "merge_1")
+            
+        mock_run.assert_called_once()
+        assert (self.resolver._git_path is not None) == git_enabled
+        if expected is None:
+            assert resolution is None
+        else:
+            assert resolution.strategy == "merged"
+            assert resolution.merged_file_path.read_text() == expected
+            
+    @pytest.mark.asyncio
+    async def test_create_merge_prompt(self):
         """マージプロンプト生成のテスト"""
         # テストファイルを作成
         existing_file = self.workspace_dir / "test.py"
@@ -215,7 +342,7 @@ class TestConflictResolver:
         new_file.write_text("new content")
         
         # プロンプトを生成
-        prompt = self.resolver._create_merge_prompt(existing_file, new_file)
+        prompt = await self.resolver._create_merge_prompt(existing_file, new_file)
         
         assert "test.py" in prompt
         assert "existing content" in prompt
@@ -223,7 +350,8 @@ class TestConflictResolver:
         assert "from new" in prompt
         assert "intelligent merge" in prompt
         
-    def test_create_three_way_merge_prompt(self):
+    @pytest.mark.asyncio
+    async def test_create_three_way_merge_prompt(self):
         """3-wayマージプロンプト生成のテスト"""
         # テストファイルを作成
         base_file = self.workspace_dir / "base.py"
@@ -236,7 +364,7 @@ class TestConflictResolver:
         task_file.write_text("task content")
         
         # プロンプトを生成
-        prompt = self.resolver._create_three_way_merge_prompt(base_file, shared_file, task_file)
+        prompt = await self.resolver._create_three_way_merge_prompt(base_file, shared_file, task_file)
         
         assert "3-way merge" in prompt
         assert "BASE version" in prompt
@@ -246,6 +374,40 @@ class TestConflictResolver:
         assert "shared content" in prompt
         assert "task content" in prompt
         
+    @pytest.mark.asyncio
+    async def test_create_three_way_merge_prompt_large_file(self):
+        """大きなファイルでは全文の代わりに差分を埋め込むテスト"""
+        lines = [f"line {i}\n" for i in range(10000)]
+        
+        base_file = self.workspace_dir / "base.py"
+        base_file.write_text("".join(lines))
+        
+        shared_file = self.workspace_dir / "shared.py"
+        shared_file.write_text("".join(["shared header\n"] + lines))
+        
+        task_file = self.workspace_dir / "task.py"
+        task_file.write_text("".join(lines + ["task footer\n"]))
+        
+        prompt = await self.resolver._create_three_way_merge_prompt(base_file, shared_file, task_file)
+        
+        assert "BASE version" not in prompt
+        assert "unified diff from BASE" in prompt
+        assert "+shared header" in prompt
+        assert "+task footer" in prompt
+        # SHAREDの全文1つ分と差分のみ
+        assert len(prompt) < len(shared_file.read_text()) * 1.5
+        
+    def test_cleanup_empty_merge_workspace(self):
+        """空のマージ作業ディレクトリのクリーンアップテスト"""
+        assert self.resolver.merge_workspace.exists()
+        
+        self.resolver.cleanup_merge_workspace()
+        
+        assert not self.resolver.merge_workspace.exists()
+        
+        # 既に削除されていても例外にならない
+        self.resolver.cleanup_merge_workspace()
+        
     def test_cleanup_merge_workspace(self):
         """マージワークスペースのクリーンアップテスト"""
         # マージワークスペースにファイルを作成
@@ -0,0 +1,76 @@
+"""
+ローカル3-wayマージのテスト
+"""
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.core.local_merge import GitMergeUnavailable, git_merge_file, merge_three_way
+
+
+class TestLocalMerge:
+    """merge_three_wayのテストスイート"""
+    
+    def test_non_overlapping_changes(self):
+        """両側が別々の箇所を変更した場合はマージできる"""
+        base = "a\nb\nc\nd\ne\n"
+        shared = "A\nb\nc\nd\ne\n"
+        task = "a\nb\nc\nd\nE\n"
+        
+        assert merge_three_way(base, shared, task) == "A\nb\nc\nd\nE\n"
+        
+    def test_one_side_unchanged(self):
+        """片側だけが変更した場合はその変更を採用する"""
+        base = "a\nb\n"
+        task = "a\nb\nc\n"
+        
+        assert merge_three_way(base, base, task) == task
+        assert merge_three_way(base, task, base) == task
+        
+    def test_identical_changes(self):
+        """両側が同じ変更をした場合（見かけ上の競合）はマージできる"""
+        base = "a\nb\nc\n"
+        changed = "a\nB\nc\n"
+        
+        assert merge_three_way(base, changed, changed) == changed
+        
+    def test_conflicting_changes(self):
+        """両側が同じ箇所を異なる内容に変更した場合はNone"""
+        base = "a\nb\nc\n"
+        shared = "a\nshared\nc\n"
+        task = "a\ntask\nc\n"
+        
+        assert merge_three_way(base, shared, task) is None
+        
+    def test_both_added_without_base(self):
+        """ベースがなく両側が異なる内容を追加した場合はNone"""
+        assert merge_three_way("", "shared\n", "task\n") is None
+        assert merge_three_way("", "same\n", "same\n") == "same\n"
+
+
+class TestGitMergeFile:
+    """git_merge_fileの終了コードの扱いのテストスイート"""
+    
+    def _run(self, returncode, stdout=b"", stderr=b""):
+        completed = subprocess.CompletedProcess([], returncode, stdout=stdout, stderr=stderr)
+        with patch("src.core.local_merge.subprocess.run", return_value=completed):
+            return git_merge_file("git", Path("base"), Path("shared"), Path("task"))
+    
+    def test_clean_merge(self):
+        """終了コード0ならマージ結果を返す"""
+        assert self._run(0, stdout=b"merged\n") == "merged\n"
+        
+    def test_conflict(self):
+        """正の終了コード（競合の数）ならNone"""
+        assert self._run(1) is None
+        
+    def test_usage_error_raises(self):
+        """usageエラー（histogram非対応など）はgitが使えないとして例外にする"""
+        with pytest.raises(GitMergeUnavailable):
+            self._run(129, stderr=b"error: unknown option `diff-algorithm=histogram'")
+            
+    def test_per_file_failure_returns_none(self):
+        """バイナリなどファイル固有の失敗はそのファイルだけ諦める"""
+        assert self._run(255, stderr=b"error: Cannot merge binary files: task") is None
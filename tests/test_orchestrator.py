@@ -1,15 +1,17 @@
 import pytest
 import asyncio
+import json
 from pathlib import Path
-import tempfile
 import yaml
 
 from src.core import Orchestrator, TaskStatus
+from src.core import orchestrator as orchestrator_module
 
 
+@pytest.mark.usefixtures("no_dry_run_delay")
 class TestOrchestrator:
     @pytest.fixture
-    def simple_wbs_file(self):
+    def simple_wbs_file(self, tmp_path):
         """シンプルなWBSファイルを作成"""
         wbs_data = {
             "project": {
@@ -36,12 +38,12 @@ class TestOrchestrator:
             ]
         }
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(wbs_data, f)
-            return f.name
+        wbs_path = tmp_path / "wbs.yaml"
+        wbs_path.write_text(yaml.dump(wbs_data), encoding='utf-8')
+        return str(wbs_path)
     
     @pytest.fixture
-    def parallel_wbs_file(self):
+    def parallel_wbs_file(self, tmp_path):
         """並列実行可能なタスクを含むWBS"""
         wbs_data = {
             "project": {
@@ -74,9 +76,9 @@ class TestOrchestrator:
             ]
         }
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(wbs_data, f)
-            return f.name
+        wbs_path = tmp_path / "wbs.yaml"
+        wbs_path.write_text(yaml.dump(wbs_data), encoding='utf-8')
+        return str(wbs_path)
     
     @pytest.mark.asyncio
     async def test_simple_sequential_execution(self, simple_wbs_file, tmp_path):
@@ -143,9 +145,9 @@ class TestOrchestrator:
             }]
         }
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(wbs_data, f)
-            wbs_path = f.name
+        wbs_file = tmp_path / "wbs.yaml"
+        wbs_file.write_text(yaml.dump(wbs_data), encoding='utf-8')
+        wbs_path = str(wbs_file)
         
         orchestrator = Orchestrator(
             wbs_path=wbs_path,
@@ -180,6 +182,7 @@ class TestOrchestrator:
         assert len(progress_updates) > 0
         assert any(u["type"] == "task_started" for u in progress_updates)
         assert any(u["type"] == "task_completed" for u in progress_updates)
+        assert all(isinstance(u["ts_ns"], int) for u in progress_updates)
     
     @pytest.mark.asyncio
     async def test_state_persistence(self, simple_wbs_file, tmp_path):
@@ -211,4 +214,117 @@ class TestOrchestrator:
         # 残りのタスクが実行されることを確認
         results = await orchestrator2.run()
         assert len(results) == 1  # task-002のみ
-        assert results[0].task_id == "task-002"
\ No newline at end of file
+        assert results[0].task_id == "task-002"
+    
+    @pytest.mark.asyncio
+    async def test_state_writes_are_debounced(self, simple_wbs_file, tmp_path):
+        """状態の保存がまとめて書き出されるテスト"""
+        state_file = tmp_path / "state.json"
+        
+        orchestrator = Orchestrator(
+            wbs_path=simple_wbs_file,
+            workspace_dir=str(tmp_path),
+            state_file=str(state_file),
+            dry_run=True
+        )
+        
+        orchestrator.graph_engine.update_task_status("task-001", TaskStatus.IN_PROGRESS)
+        orchestrator._save_state()
+        orchestrator.graph_engine.update_task_status("task-001", TaskStatus.COMPLETED)
+        orchestrator._save_state()
+        
+        # 予約されただけでまだ書き込まれていない
+        assert not state_file.exists()
+        
+        await orchestrator._flush_state()
+        
+        state = json.loads(state_file.read_text())
+        assert state["task_status"]["task-001"] == "completed"
+    
+    @pytest.mark.asyncio
+    async def test_scheduled_state_flush_task_is_kept(self, simple_wbs_file, tmp_path, monkeypatch):
+        """予約された書き出しのタスクが保持され、完了まで追跡できるテスト"""
+        monkeypatch.setattr(orchestrator_module, "STATE_FLUSH_INTERVAL", 0)
+        state_file = tmp_path / "state.json"
+        
+        orchestrator = Orchestrator(
+            wbs_path=simple_wbs_file,
+            workspace_dir=str(tmp_path),
+            state_file=str(state_file),
+            dry_run=True
+        )
+        
+        orchestrator._save_state()
+        while orchestrator._state_flush_task is None:
+            await asyncio.sleep(0)
+        await orchestrator._state_flush_task
+        
+        assert orchestrator._state_flush_handle is None
+        assert json.loads(state_file.read_text())["task_status"]["task-001"] == "pending"
+    
+    @pytest.mark.asyncio
+    async def test_unlocked_task_starts_without_waiting_for_wave(self, tmp_path):
+        """依存が解決したタスクが、同時に実行中の遅いタスクを待たずに開始されるテスト"""
+        wbs_data = {
+            "project": {"name": "スケジューリングテスト"},
+            "phases": [{
+                "id": "phase1",
+                "tasks": [
+                    {"id": "slow", "name": "遅いタスク", "dependencies": []},
+                    {"id": "fast", "name": "速いタスク", "dependencies": []},
+                    {"id": "next", "name": "後続タスク", "dependencies": ["fast"]}
+                ]
+            }]
+        }
+        wbs_path = tmp_path / "wbs.yaml"
+        wbs_path.write_text(yaml.dump(wbs_data))
+        
+        orchestrator = Orchestrator(
+            wbs_path=str(wbs_path),
+            workspace_dir=str(tmp_path),
+            dry_run=True,
+            max_concurrent=2
+        )
+        
+        original_execute = orchestrator._execute_task
+        
+        async def execute_with_delay(task_dict):
+            if task_dict["id"] == "slow":
+                await asyncio.sleep(0.5)
+            return await original_execute(task_dict)
+            
+        orchestrator._execute_task = execute_with_delay
+        
+        results = await orchestrator.run()
+        
+        assert [r.task_id for r in results] == ["fast", "next", "slow"]
+    
+    @pytest.mark.asyncio
+    async def test_integrate_artifacts(self, simple_wbs_file, tmp_path):
+        """複数タスクの成果物の統合テスト"""
+        from src.core import ExecutionResult
+        
+        orchestrator = Orchestrator(
+            wbs_path=simple_wbs_file,
+            workspace_dir=str(tmp_path),
+            dry_run=True
+        )
+        
+        for task_id, own_file in [("task-001", "b.txt"), ("task-002", "c.txt")]:
+            task_dir = tmp_path / task_id
+            task_dir.mkdir()
+            (task_dir / "a.txt").write_text("shared")
+            (task_dir / own_file).write_text(task_id)
+            orchestrator.results.append(ExecutionResult(
+                task_id=task_id,
+                success=True,
+                artifacts=["a.txt", own_file]
+            ))
+            
+        await orchestrator._integrate_artifacts()
+        
+        integrated_dir = tmp_path / "integrated"
+        assert sorted(p.name for p in integrated_dir.iterdir()) == [
+            "README.md", "a.txt", "b.txt", "c.txt"
+        ]
+        assert "File Conflicts" not in (integrated_dir / "README.md").read_text()
@@ -3,29 +3,27 @@
 """
 import pytest
 import asyncio
+import os
+import time
 from pathlib import Path
-import tempfile
 import shutil
-from unittest.mock import Mock, patch, AsyncMock
+from unittest.mock import patch
 
 from src.core.artifact_manager import ArtifactManager, FileMetadata
-from src.core.task_executor import TaskExecutor, ExecutionResult
+from src.core.task_executor import TaskExecutor
 from src.core.conflict_resolver import ConflictResolver, ConflictResolution
 
 
 class TestSharedContext:
     """共有コンテキスト機能のテストスイート"""
     
-    def setup_method(self):
-        """各テストの前処理"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.workspace_dir = Path(self.temp_dir) / "workspace"
+    @pytest.fixture(autouse=True)
+    def setup_workspace(self, tmp_path):
+        """各テストの前処理（一時ディレクトリの削除はpytestに任せる）"""
+        self.temp_dir = tmp_path
+        self.workspace_dir = tmp_path / "workspace"
         self.workspace_dir.mkdir()
         
-    def teardown_method(self):
-        """各テストの後処理"""
-        shutil.rmtree(self.temp_dir)
-        
     def test_prepare_task_workspace_empty(self):
         """共有ワークスペースが空の場合のテスト"""
         artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
@@ -90,6 +88,94 @@ class TestSharedContext:
             assert metadata.size > 0
             assert metadata.mtime > 0
             
+    def test_hash_cache(self):
+        """ハッシュキャッシュのテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        
+        test_file = self.workspace_dir / "cached.py"
+        test_file.write_text("content")
+        
+        # 十分古いmtimeのファイルはキャッシュされる
+        old_mtime = time.time() - 60
+        os.utime(test_file, (old_mtime, old_mtime))
+        first_hash = artifact_manager._cached_hash(test_file)
+        assert len(artifact_manager._hash_cache) == 1
+        assert artifact_manager._cached_hash(test_file) == first_hash
+        
+        # 内容が変わればmtimeも変わるため再計算される
+        test_file.write_text("changed")
+        assert artifact_manager._cached_hash(test_file) != first_hash
+        
+        # 直近に更新されたファイルはキャッシュされない
+        assert len(artifact_manager._hash_cache) == 1
+        
+    def test_mmap_hash_matches_buffered_hash(self):
+        """mmapで計算したハッシュ値が通常の読み込みと一致することをテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        
+        test_file = self.workspace_dir / "large.bin"
+        test_file.write_bytes(os.urandom(4096) * 16)
+        
+        buffered_hash = artifact_manager._calculate_hash(test_file)
+        with patch("src.core.artifact_manager.MMAP_HASH_THRESHOLD", 1):
+            assert artifact_manager._calculate_hash(test_file) == buffered_hash
+        
+    def test_seed_hash_cache_after_copy(self):
+        """コピー先のハッシュがキャッシュに登録されるテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        
+        src_file = self.workspace_dir / "src.py"
+        src_file.write_text("content")
+        old_mtime = time.time() - 60
+        os.utime(src_file, (old_mtime, old_mtime))
+        metadata = artifact_manager._create_snapshot(self.workspace_dir)["src.py"]
+        
+        dst_file = self.workspace_dir / "dst.py"
+        shutil.copy2(src_file, dst_file)
+        artifact_manager._seed_hash_cache(dst_file, metadata)
+        
+        stat = dst_file.stat()
+        assert artifact_manager._hash_cache[(str(dst_file), stat.st_size, stat.st_mtime_ns)] == metadata.hash
+        
+    def test_snapshot_reuses_previous_metadata(self):
+        """サイズとmtimeが変わらないファイルは前回のメタデータを再利用するテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        
+        test_dir = self.workspace_dir / "test"
+        test_dir.mkdir()
+        (test_dir / "old.py").write_text("old")
+        old_mtime = time.time() - 60
+        os.utime(test_dir / "old.py", (old_mtime, old_mtime))
+        old_mtime = (test_dir / "old.py").stat().st_mtime
+        
+        prev = {"old.py": FileMetadata(hash="prev_hash", size=3, mtime=old_mtime, stable=True)}
+        snapshot = artifact_manager._create_snapshot(test_dir, prev)
+        assert snapshot["old.py"].hash == "prev_hash"
+        
+        # stableでないメタデータは再利用しない
+        prev = {"old.py": FileMetadata(hash="prev_hash", size=3, mtime=old_mtime)}
+        snapshot = artifact_manager._create_snapshot(test_dir, prev)
+        assert snapshot["old.py"].hash != "prev_hash"
+        
+    @pytest.mark.asyncio
+    async def test_prepare_reuses_shared_snapshot(self):
+        """統合済みの共有ワークスペースのハッシュがタスク用コピーのスナップショットで再利用されるテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        
+        task1_workspace = artifact_manager.prepare_task_workspace("task1")
+        new_file = task1_workspace / "module.py"
+        new_file.write_text("print('task1')")
+        old_mtime = time.time() - 60
+        os.utime(new_file, (old_mtime, old_mtime))
+        await artifact_manager.integrate_task_results("task1", task1_workspace)
+        
+        with patch.object(artifact_manager, '_calculate_hash', wraps=artifact_manager._calculate_hash) as mock_hash:
+            artifact_manager.prepare_task_workspace("task2")
+            mock_hash.assert_not_called()
+        
+        assert artifact_manager.task_snapshots["task2"]["module.py"].hash == \
+            artifact_manager._calculate_hash(self.workspace_dir / "shared" / "module.py")
+        
     def test_detect_changes(self):
         """差分検出のテスト"""
         artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
@@ -210,7 +296,100 @@ class TestSharedContext:
             assert (artifact_manager.shared_workspace / "conflict_task2.py").exists()
             
     @pytest.mark.asyncio
-    async def test_task_executor_with_shared_context(self):
+    async def test_integrate_keeps_task_version_when_merge_produces_nothing(self, mock_subprocess_exec):
+        """Claudeのマージタスクが何も出力しなかった場合、タスク側の変更が失われないテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        executor = TaskExecutor(workspace_dir=str(self.workspace_dir))
+        conflict_resolver = ConflictResolver(self.workspace_dir, executor=executor)
+        
+        artifact_manager.shared_workspace.mkdir()
+        (artifact_manager.shared_workspace / "main.py").write_text("original\n")
+        
+        # 2つのタスクが同じ状態から開始し、同じ行を別々に変更する
+        task0_workspace = artifact_manager.prepare_task_workspace("t0")
+        task1_workspace = artifact_manager.prepare_task_workspace("t1")
+        (task0_workspace / "main.py").write_text("t0 change\n")
+        (task1_workspace / "main.py").write_text("t1 change\n")
+        
+        await artifact_manager.integrate_task_results("t0", task0_workspace, conflict_resolver)
+        
+        # マージタスクは成功するが、ファイルを何も書かない
+        mock_subprocess_exec()
+        result = await artifact_manager.integrate_task_results("t1", task1_workspace, conflict_resolver)
+        
+        assert result["conflict"] == 1
+        assert result["modified"] == 0
+        shared = artifact_manager.shared_workspace
+        assert (shared / "main.py").read_text() == "t0 change\n"
+        assert (shared / "main_t1.py").read_text() == "t1 change\n"
+        
+    @pytest.mark.asyncio
+    async def test_integrate_merges_conflicting_files_concurrently(self):
+        """1タスク内の複数の競合ファイルが並行してマージされることをテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        conflict_resolver = ConflictResolver(self.workspace_dir)
+        
+        artifact_manager.shared_workspace.mkdir()
+        for name in ("a.py", "b.py"):
+            (artifact_manager.shared_workspace / name).write_text("original")
+        
+        task_workspace = artifact_manager.prepare_task_workspace("task1")
+        for name in ("a.py", "b.py"):
+            # タスク開始後に共有側も変更された状態にする
+            (artifact_manager.shared_workspace / name).write_text("shared change")
+            (task_workspace / name).write_text("task change")
+        
+        active = 0
+        max_active = 0
+        
+        async def resolve(base_file, shared_file, task_file, task_id, artifact_manager):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            merged = self.workspace_dir / f"merged_{shared_file.name}"
+            merged.write_text(f"merged {shared_file.name}")
+            return ConflictResolution(strategy="merged", merged_file_path=merged)
+        
+        with patch.object(conflict_resolver, 'resolve_three_way_conflict', side_effect=resolve):
+            result = await artifact_manager.integrate_task_results("task1", task_workspace, conflict_resolver)
+        
+        assert max_active == 2
+        assert result["modified"] == 2
+        assert (artifact_manager.shared_workspace / "a.py").read_text() == "merged a.py"
+        assert (artifact_manager.shared_workspace / "b.py").read_text() == "merged b.py"
+        
+    @pytest.mark.asyncio
+    async def test_integrate_batch_same_new_file(self):
+        """同じバッチで複数タスクが同名の新規ファイルを作成した場合のテスト"""
+        artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
+        
+        task1_workspace = artifact_manager.prepare_task_workspace("task1")
+        task2_workspace = artifact_manager.prepare_task_workspace("task2")
+        task3_workspace = artifact_manager.prepare_task_workspace("task3")
+        (task1_workspace / "config.py").write_text("task1 config")
+        (task2_workspace / "config.py").write_text("task2 config")
+        (task3_workspace / "config.py").write_text("task1 config")
+        
+        results = await artifact_manager.integrate_batch([
+            ("task1", task1_workspace),
+            ("task2", task2_workspace),
+            ("task3", task3_workspace)
+        ])
+        
+        # 先に統合したタスクの内容は上書きされない
+        assert results[0]["new"] == 1
+        assert results[1]["conflict"] == 1
+        # 同じ内容なら競合にならない
+        assert results[2] == {"new": 0, "modified": 0, "conflict": 0, "deleted": 0}
+        
+        shared = artifact_manager.shared_workspace
+        assert (shared / "config.py").read_text() == "task1 config"
+        assert (shared / "config_task2.py").read_text() == "task2 config"
+        
+    @pytest.mark.asyncio
+    async def test_task_executor_with_shared_context(self, mock_subprocess_exec):
         """TaskExecutorの共有コンテキスト対応テスト"""
         artifact_manager = ArtifactManager(workspace_dir=self.workspace_dir)
         executor = TaskExecutor(workspace_dir=str(self.workspace_dir))
@@ -220,24 +399,20 @@ class TestSharedContext:
         (artifact_manager.shared_workspace / "shared_file.py").write_text("shared content")
         
         # モックタスクを実行
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            mock_process = AsyncMock()
-            mock_process.returncode = 0
-            mock_process.communicate.return_value = (b"output", b"")
-            mock_subprocess.return_value = mock_process
-            
-            task = {
-                "id": "test_task",
-                "name": "Test Task",
-                "prompt": "test prompt",
-                "shared_context": True
-            }
-            
-            result = await executor.execute(task, artifact_manager)
-            
-            assert result.success
-            assert result.workspace is not None
-            assert result.workspace.name == "task_test_task"
-            
-            # 共有ファイルがコピーされていることを確認
-            assert (result.workspace / "shared_file.py").exists()
\ No newline at end of file
+        mock_subprocess_exec(stdout=b"output")
+        
+        task = {
+            "id": "test_task",
+            "name": "Test Task",
+            "prompt": "test prompt",
+            "shared_context": True
+        }
+        
+        result = await executor.execute(task, artifact_manager)
+        
+        assert result.success
+        assert result.workspace is not None
+        assert result.workspace.name == "task_test_task"
+        
+        # 共有ファイルがコピーされていることを確認
+        assert (result.workspace / "shared_file.py").exists()
\ No newline at end of file
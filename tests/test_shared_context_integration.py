@@ -3,28 +3,21 @@
 実際のタスク実行フローを通じて機能を検証
 """
 import pytest
-import asyncio
-from pathlib import Path
-import tempfile
-import shutil
-import yaml
 
 from src.core.orchestrator import Orchestrator
 
 
+@pytest.mark.usefixtures("no_dry_run_delay")
 class TestSharedContextIntegration:
     """共有コンテキスト機能の統合テストスイート"""
     
-    def setup_method(self):
-        """各テストの前処理"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.workspace_dir = Path(self.temp_dir) / "workspace"
+    @pytest.fixture(autouse=True)
+    def setup_workspace(self, tmp_path):
+        """各テストの前処理（一時ディレクトリの削除はpytestに任せる）"""
+        self.temp_dir = tmp_path
+        self.workspace_dir = tmp_path / "workspace"
         self.workspace_dir.mkdir()
         
-    def teardown_method(self):
-        """各テストの後処理"""
-        shutil.rmtree(self.temp_dir)
-        
     @pytest.mark.asyncio
     async def test_shared_context_simple_project(self):
         """シンプルなプロジェクトでの共有コンテキストテスト"""
@@ -195,22 +188,18 @@ phases:
         assert len(results) == 1
         assert results[0].success
         
-    def test_wbs_with_shared_context_flag(self):
+    @pytest.mark.parametrize("yaml_content, expected", [
+        ("execution:\n  shared_context: true", True),
+        ("execution:\n  shared_context: false", False),
+        ("execution:\n  other_setting: value", False),
+        ("# No execution section", False),
+        ("execution:\n  shared_context: yes", True),  # YAMLのbool解釈
+        ("execution:\n  shared_context: no", False),  # YAMLのbool解釈
+    ])
+    def test_wbs_with_shared_context_flag(self, yaml_content, expected):
         """WBSファイルの共有コンテキストフラグ解析テスト"""
-        # 様々な設定パターンをテスト
-        test_cases = [
-            # (yaml_content, expected_result)
-            ("execution:\n  shared_context: true", True),
-            ("execution:\n  shared_context: false", False),
-            ("execution:\n  other_setting: value", False),
-            ("# No execution section", False),
-            ("execution:\n  shared_context: yes", True),  # YAMLのbool解釈
-            ("execution:\n  shared_context: no", False),  # YAMLのbool解釈
-        ]
-        
-        for yaml_content, expected in test_cases:
-            wbs_file = self.workspace_dir / f"test_{expected}.yaml"
-            full_content = f"""
+        wbs_file = self.workspace_dir / f"test_{expected}.yaml"
+        full_content = f"""
 project: test
 phases:
   - id: phase1
@@ -221,10 +210,9 @@ phases:
 
 {yaml_content}
 """
-            wbs_file.write_text(full_content)
-            
-            orchestrator = Orchestrator(
-                wbs_path=str(wbs_file),
-                workspace_dir=str(self.workspace_dir)
-            )
-            
+        wbs_file.write_text(full_content)
+        
+        orchestrator = Orchestrator(
+            wbs_path=str(wbs_file),
+            workspace_dir=str(self.workspace_dir)
+        )
@@ -2,8 +2,6 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 import asyncio
 from pathlib import Path
-import tempfile
-import shutil
 
 from src.core import TaskExecutor, ExecutionResult
 from src.core.artifact_manager import ArtifactManager
@@ -11,11 +9,9 @@ from src.core.artifact_manager import ArtifactManager
 
 class TestTaskExecutor:
     @pytest.fixture
-    def temp_workspace(self):
+    def temp_workspace(self, tmp_path):
         """一時的な作業ディレクトリを作成"""
-        workspace = tempfile.mkdtemp()
-        yield workspace
-        shutil.rmtree(workspace)
+        return str(tmp_path)
     
     @pytest.fixture
     def executor(self, temp_workspace):
@@ -35,7 +31,7 @@ class TestTaskExecutor:
         return mock_manager
     
     @pytest.mark.asyncio
-    async def test_execute_simple_task(self, executor, mock_artifact_manager):
+    async def test_execute_simple_task(self, executor, mock_artifact_manager, mock_subprocess_exec):
         """シンプルなタスクの実行"""
         task = {
             "id": "test-001",
@@ -43,25 +39,17 @@ class TestTaskExecutor:
             "prompt": "Create a hello.txt file with 'Hello, World!' content"
         }
         
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            # モックプロセスの設定
-            mock_process = MagicMock()
-            # 非同期関数として定義
-            async def mock_communicate():
-                return (b"Created hello.txt", b"")
-            mock_process.communicate = mock_communicate
-            mock_process.returncode = 0
-            mock_subprocess.return_value = mock_process
-            
-            result = await executor.execute(task, mock_artifact_manager)
-            
-            assert result.success is True
-            assert result.task_id == "test-001"
-            assert "hello.txt" in result.stdout
-            assert result.stderr == ""
+        mock_subprocess_exec(stdout=b"Created hello.txt")
+        
+        result = await executor.execute(task, mock_artifact_manager)
+        
+        assert result.success is True
+        assert result.task_id == "test-001"
+        assert "hello.txt" in result.stdout
+        assert result.stderr == ""
     
     @pytest.mark.asyncio
-    async def test_execute_with_error(self, executor, mock_artifact_manager):
+    async def test_execute_with_error(self, executor, mock_artifact_manager, mock_subprocess_exec):
         """エラーが発生するタスクの実行"""
         task = {
             "id": "test-002",
@@ -69,22 +57,16 @@ class TestTaskExecutor:
             "prompt": "This will cause an error"
         }
         
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            mock_process = MagicMock()
-            async def mock_communicate():
-                return (b"", b"Error: Task failed")
-            mock_process.communicate = mock_communicate
-            mock_process.returncode = 1
-            mock_subprocess.return_value = mock_process
-            
-            result = await executor.execute(task, mock_artifact_manager)
-            
-            assert result.success is False
-            assert result.task_id == "test-002"
-            assert "Error" in result.stderr
+        mock_subprocess_exec(returncode=1, stderr=b"Error: Task failed")
+        
+        result = await executor.execute(task, mock_artifact_manager)
+        
+        assert result.success is False
+        assert result.task_id == "test-002"
+        assert "Error" in result.stderr
     
     @pytest.mark.asyncio
-    async def test_timeout_handling(self, executor, mock_artifact_manager):
+    async def test_timeout_handling(self, executor, mock_artifact_manager, mock_subprocess_exec):
         """タイムアウト処理のテスト"""
         task = {
             "id": "test-003",
@@ -94,28 +76,26 @@ class TestTaskExecutor:
         
         executor.timeout = 0.1  # 100msでタイムアウト
         
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            async def long_running():
-                await asyncio.sleep(1)  # 1秒待機
-                return (b"Should not reach here", b"")
-            
-            mock_process = MagicMock()
-            mock_process.communicate = long_running
-            mock_process.kill = MagicMock()
-            # waitメソッドも非同期関数として定義
-            async def mock_wait():
-                pass
-            mock_process.wait = mock_wait
-            mock_subprocess.return_value = mock_process
-            
-            result = await executor.execute(task, mock_artifact_manager)
-            
-            assert result.success is False
-            assert "timeout" in result.error.lower()
-            mock_process.kill.assert_called_once()
+        async def long_running():
+            await asyncio.sleep(1)  # 1秒待機
+            return (b"Should not reach here", b"")
+        
+        mock_process = mock_subprocess_exec()
+        mock_process.communicate = long_running
+        # waitメソッドも非同期関数として定義
+        async def mock_wait():
+            pass
+        mock_process.wait = mock_wait
+        
+        result = await executor.execute(task, mock_artifact_manager)
+        
+        assert result.success is False
+        assert "timeout" in result.error.lower()
+        mock_process.kill.assert_called_once()
     
     @pytest.mark.asyncio
-    async def test_artifact_collection(self, executor, mock_artifact_manager, temp_workspace):
+    async def test_artifact_collection(self, executor, mock_artifact_manager, temp_workspace,
+                                       mock_subprocess_exec):
         """生成物の収集テスト"""
         task = {
             "id": "test-004",
@@ -128,19 +108,94 @@ class TestTaskExecutor:
         test_file.parent.mkdir(parents=True, exist_ok=True)
         test_file.write_text("Test content")
         
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            mock_process = MagicMock()
-            async def mock_communicate():
-                return (b"Created files", b"")
-            mock_process.communicate = mock_communicate
-            mock_process.returncode = 0
-            mock_subprocess.return_value = mock_process
-            
+        mock_subprocess_exec(stdout=b"Created files")
+        
+        result = await executor.execute(task, mock_artifact_manager)
+        
+        assert result.success is True
+        assert len(result.artifacts) > 0
+        assert "output.txt" in result.artifacts[0]
+    
+    @pytest.mark.asyncio
+    async def test_extracted_files_added_without_rescan(self, executor, mock_artifact_manager,
+                                                        mock_subprocess_exec):
+        """出力から抽出したファイルが再走査なしで生成物に追加されるテスト"""
+        task = {
+            "id": "test-extract",
+            "name": "抽出タスク",
+            "prompt": "Create hello.py"
+        }
+        
+        mock_subprocess_exec(stdout=b"```python hello.py\nprint('hello')\n```\n")
+        
+        with patch.object(executor, '_collect_artifacts', wraps=executor._collect_artifacts) as mock_collect:
             result = await executor.execute(task, mock_artifact_manager)
             
-            assert result.success is True
-            assert len(result.artifacts) > 0
-            assert "output.txt" in result.artifacts[0]
+            assert mock_collect.call_count == 1
+            
+        assert result.success is True
+        assert "hello.py" in result.artifacts
+        assert result.artifacts == ["hello.py"]
+        assert (result.workspace / "hello.py").read_text() == "print('hello')"
+        # 標準出力は作業ディレクトリの外に保存され、統合対象にならない
+        assert result.output_file.parent == result.workspace.parent
+        assert result.output_file.read_bytes() == b"```python hello.py\nprint('hello')\n```\n"
+    
+    @pytest.mark.asyncio
+    async def test_extracted_files_outside_workspace_are_skipped(self, executor, mock_artifact_manager,
+                                                                 mock_subprocess_exec):
+        """task_dirの外を指すファイル名のコードブロックは保存しないテスト"""
+        task = {
+            "id": "test-escape",
+            "name": "不正パスタスク",
+            "prompt": "Create files"
+        }
+        
+        mock_subprocess_exec(
+            stdout=b"```python ../evil.py\nprint('evil')\n```\n"
+                   b"```python ok.py\nprint('ok')\n```\n"
+        )
+        
+        result = await executor.execute(task, mock_artifact_manager)
+        
+        assert result.success is True
+        assert result.artifacts == ["ok.py"]
+        assert not (result.workspace.parent / "evil.py").exists()
+        assert (result.workspace / "ok.py").read_text() == "print('ok')"
+    
+    def test_collect_artifacts_nested(self, executor, temp_workspace):
+        """サブディレクトリを含む生成物の収集テスト"""
+        task_dir = Path(temp_workspace) / "task_nested"
+        (task_dir / "src" / "pkg").mkdir(parents=True)
+        (task_dir / "README.md").write_text("readme")
+        (task_dir / "src" / "pkg" / "module.py").write_text("pass")
+        (task_dir / "empty").mkdir()
+        # .claudeディレクトリの中身は収集しない
+        (task_dir / ".claude").mkdir()
+        (task_dir / ".claude" / "settings.json").write_text("{}")
+        
+        artifacts = executor._collect_artifacts(task_dir)
+        
+        assert sorted(artifacts) == sorted([
+            "README.md",
+            str(Path("src") / "pkg" / "module.py")
+        ])
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_workspace(self, executor, temp_workspace):
+        """作業ディレクトリのクリーンアップテスト"""
+        task_dir = Path(temp_workspace) / "task-001"
+        task_dir.mkdir()
+        (task_dir / "file.txt").write_text("content")
+        (Path(temp_workspace) / "other.txt").write_text("content")
+        
+        await executor.cleanup_workspace("task-001")
+        assert not task_dir.exists()
+        assert (Path(temp_workspace) / "other.txt").exists()
+        
+        await executor.cleanup_workspace()
+        assert Path(temp_workspace).exists()
+        assert list(Path(temp_workspace).iterdir()) == []
     
     def test_command_construction(self, executor, mock_artifact_manager):
         """Claudeコマンドの構築テスト"""
@@ -157,61 +212,81 @@ class TestTaskExecutor:
         assert task["prompt"] in cmd
     
     @pytest.mark.asyncio
-    async def test_workspace_isolation(self, executor, mock_artifact_manager, temp_workspace):
+    async def test_workspace_isolation(self, executor, mock_artifact_manager, temp_workspace,
+                                       mock_subprocess_exec):
         """作業ディレクトリの分離テスト"""
         task1 = {"id": "task-001", "name": "Task 1", "prompt": "Task 1"}
         task2 = {"id": "task-002", "name": "Task 2", "prompt": "Task 2"}
         
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            mock_process = MagicMock()
-            async def mock_communicate():
-                return (b"Success", b"")
-            mock_process.communicate = mock_communicate
-            mock_process.returncode = 0
-            mock_subprocess.return_value = mock_process
-            
-            await executor.execute(task1, mock_artifact_manager)
-            await executor.execute(task2, mock_artifact_manager)
-            
-            # 各タスクが別々のディレクトリで実行されているか確認
-            task1_dir = Path(temp_workspace) / "task_task-001"
-            task2_dir = Path(temp_workspace) / "task_task-002"
-            
-            assert task1_dir.exists()
-            assert task2_dir.exists()
+        mock_subprocess_exec(stdout=b"Success")
+        
+        await executor.execute(task1, mock_artifact_manager)
+        await executor.execute(task2, mock_artifact_manager)
+        
+        # 各タスクが別々のディレクトリで実行されているか確認
+        task1_dir = Path(temp_workspace) / "task_task-001"
+        task2_dir = Path(temp_workspace) / "task_task-002"
+        
+        assert task1_dir.exists()
+        assert task2_dir.exists()
     
     @pytest.mark.asyncio
-    async def test_concurrent_execution_limit(self, executor, mock_artifact_manager):
+    async def test_concurrent_execution_limit(self, mock_artifact_manager, temp_workspace, monkeypatch):
         """並列実行数制限のテスト"""
-        executor.max_concurrent = 2
+        executor = TaskExecutor(workspace_dir=temp_workspace, max_concurrent=2)
         
         tasks = [
             {"id": f"task-{i}", "name": f"Task {i}", "prompt": f"Task {i}"}
             for i in range(5)
         ]
         
-        with patch('asyncio.create_subprocess_exec') as mock_subprocess:
-            call_count = 0
-            active_processes = []
-            
-            async def track_concurrent():
-                nonlocal call_count
-                call_count += 1
-                active_processes.append(call_count)
-                await asyncio.sleep(0.1)
-                active_processes.remove(call_count)
-                mock = MagicMock()
-                async def mock_communicate():
-                    return (b"Success", b"")
-                mock.communicate = mock_communicate
-                mock.returncode = 0
-                return mock
-            
-            mock_subprocess.side_effect = track_concurrent
-            
-            # 全タスクを並列実行
-            results = await asyncio.gather(*[executor.execute(task) for task in tasks])
-            
-            # 同時実行数が制限を超えていないことを確認
-            max_concurrent_observed = max(len(active_processes) for _ in range(100))
-            assert max_concurrent_observed <= 2
\ No newline at end of file
+        active = 0
+        peak = 0
+        
+        async def track_concurrent(*cmd, **kwargs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            mock = MagicMock()
+            async def mock_communicate():
+                return (None, b"")
+            mock.communicate = mock_communicate
+            mock.returncode = 0
+            return mock
+        
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", track_concurrent)
+        
+        # 全タスクを並列実行
+        results = await asyncio.gather(*[executor.execute(task, mock_artifact_manager) for task in tasks])
+        
+        # 同時実行数が制限を超えていないことを確認
+        assert all(r.success for r in results)
+        assert peak == 2
+    
+    @pytest.mark.asyncio
+    async def test_execute_batch_bounded_workers(self, executor):
+        """バッチ実行はmax_concurrent個までしかexecuteを同時に生成しない"""
+        tasks = [{"id": f"task-{i}", "name": f"Task {i}", "prompt": f"Task {i}"} for i in range(7)]
+        active = 0
+        max_active = 0
+        
+        async def fake_execute(task, artifact_manager=None):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            if task["id"] == "task-4":
+                raise RuntimeError("boom")
+            return ExecutionResult(task_id=task["id"], success=True)
+        
+        with patch.object(executor, "execute", side_effect=fake_execute):
+            results = await executor.execute_batch(tasks)
+        
+        assert max_active == executor.max_concurrent
+        # 結果は入力順で返り、例外は失敗結果に変換される
+        assert [r.task_id for r in results] == [t["id"] for t in tasks]
+        assert [r.success for r in results] == [True] * 4 + [False] + [True] * 2
+        assert results[4].error == "boom"
@@ -1,88 +1,98 @@
 import pytest
+import sys
 from pathlib import Path
 from src.core import TaskGraphEngine, TaskStatus
-from src.core.task_graph_engine import Task
+from src.core.task_graph_engine import Task, load_wbs
 import yaml
-import tempfile
 
+# libyamlがあればCダンパーで書き出す（WBSの読み込み側のCSafeLoaderに合わせる）
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
 
-class TestTaskGraphEngine:
-    @pytest.fixture
-    def simple_wbs(self):
-        """シンプルなWBS構造を作成"""
-        wbs_data = {
-            "project": {
-                "name": "テストプロジェクト"
-            },
-            "phases": [
-                {
-                    "id": "phase1",
-                    "tasks": [
-                        {
-                            "id": "task-001",
-                            "name": "タスク1",
-                            "dependencies": []
-                        },
-                        {
-                            "id": "task-002", 
-                            "name": "タスク2",
-                            "dependencies": ["task-001"]
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(wbs_data, f)
-            return f.name
 
-    @pytest.fixture
-    def complex_wbs(self):
-        """複雑な依存関係を持つWBS"""
-        wbs_data = {
-            "project": {
-                "name": "複雑なプロジェクト"
+def dump_wbs(wbs_data) -> str:
+    """WBSのデータをYAML文字列にする"""
+    return yaml.dump(wbs_data, Dumper=YAML_DUMPER)
+
+
+@pytest.fixture(scope="module")
+def simple_wbs(tmp_path_factory):
+    """シンプルなWBS構造を作成（読み取り専用なのでモジュール内で共有する）"""
+    wbs_data = {
+        "project": {
+            "name": "テストプロジェクト"
+        },
+        "phases": [
+            {
+                "id": "phase1",
+                "tasks": [
+                    {
+                        "id": "task-001",
+                        "name": "タスク1",
+                        "dependencies": []
+                    },
+                    {
+                        "id": "task-002", 
+                        "name": "タスク2",
+                        "dependencies": ["task-001"]
+                    }
+                ]
+            }
+        ]
+    }
+    
+    wbs_path = tmp_path_factory.mktemp("wbs") / "wbs.yaml"
+    wbs_path.write_text(dump_wbs(wbs_data), encoding='utf-8')
+    return str(wbs_path)
+
+
+@pytest.fixture(scope="module")
+def complex_wbs(tmp_path_factory):
+    """複雑な依存関係を持つWBS（読み取り専用なのでモジュール内で共有する）"""
+    wbs_data = {
+        "project": {
+            "name": "複雑なプロジェクト"
+        },
+        "phases": [
+            {
+                "id": "phase1",
+                "tasks": [
+                    {
+                        "id": "task-001",
+                        "name": "タスクA",
+                        "dependencies": []
+                    },
+                    {
+                        "id": "task-002",
+                        "name": "タスクB", 
+                        "dependencies": []
+                    },
+                    {
+                        "id": "task-003",
+                        "name": "タスクC",
+                        "dependencies": ["task-001", "task-002"]
+                    }
+                ]
             },
-            "phases": [
-                {
-                    "id": "phase1",
-                    "tasks": [
-                        {
-                            "id": "task-001",
-                            "name": "タスクA",
-                            "dependencies": []
-                        },
-                        {
-                            "id": "task-002",
-                            "name": "タスクB", 
-                            "dependencies": []
-                        },
-                        {
-                            "id": "task-003",
-                            "name": "タスクC",
-                            "dependencies": ["task-001", "task-002"]
-                        }
-                    ]
-                },
-                {
-                    "id": "phase2",
-                    "depends_on_phase": "phase1",
-                    "tasks": [
-                        {
-                            "id": "task-004",
-                            "name": "タスクD",
-                            "dependencies": []
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(wbs_data, f)
-            return f.name
+            {
+                "id": "phase2",
+                "depends_on_phase": "phase1",
+                "tasks": [
+                    {
+                        "id": "task-004",
+                        "name": "タスクD",
+                        "dependencies": []
+                    }
+                ]
+            }
+        ]
+    }
+    
+    wbs_path = tmp_path_factory.mktemp("wbs") / "wbs.yaml"
+    wbs_path.write_text(dump_wbs(wbs_data), encoding='utf-8')
+    return str(wbs_path)
+
 
+class TestTaskGraphEngine:
     def test_load_simple_wbs(self, simple_wbs):
         """WBSファイルを正しく読み込めるか"""
         engine = TaskGraphEngine(simple_wbs)
@@ -93,6 +103,36 @@ class TestTaskGraphEngine:
         assert engine.tasks["task-001"].name == "タスク1"
         assert engine.tasks["task-002"].dependencies == ["task-001"]
 
+    def test_load_parsed_wbs(self, complex_wbs):
+        """解析済みのWBSからもファイルと同じグラフが作られるテスト"""
+        from_file = TaskGraphEngine(complex_wbs)
+        from_dict = TaskGraphEngine(load_wbs(complex_wbs))
+        
+        assert from_dict.tasks == from_file.tasks
+        assert from_dict.phase_dependencies == from_file.phase_dependencies
+        assert from_dict.get_executable_tasks() == from_file.get_executable_tasks()
+
+    def test_task_ids_are_interned(self):
+        """依存先のIDとタスクのキーが同じ文字列オブジェクトを共有するテスト"""
+        # 実行時に組み立てた文字列は別オブジェクトになる
+        wbs_data = {"phases": [{"id": "p1", "tasks": [
+            {"id": "".join(["task", "-a"]), "name": "A"},
+            {"id": "task-b", "name": "B", "dependencies": ["".join(["task", "-a"])]}
+        ]}]}
+        engine = TaskGraphEngine(wbs_data)
+        
+        task_key = next(key for key in engine.tasks if key == "task-a")
+        assert engine.tasks["task-b"].dependencies[0] is task_key
+
+    @pytest.mark.skipif(sys.version_info < (3, 10), reason="dataclassのslotsは3.10以降")
+    def test_task_has_no_instance_dict(self, simple_wbs):
+        """Taskは__slots__で定義され、インスタンスごとの__dict__を持たないテスト"""
+        task = TaskGraphEngine(simple_wbs).tasks["task-001"]
+        
+        assert not hasattr(task, "__dict__")
+        assert task.name == "タスク1"
+        assert task.dependencies == []
+
     def test_get_executable_tasks_initial(self, simple_wbs):
         """初期状態で実行可能なタスクを取得"""
         engine = TaskGraphEngine(simple_wbs)
@@ -144,6 +184,59 @@ class TestTaskGraphEngine:
         executable = engine.get_executable_tasks()
         assert any(t.id == "task-004" for t in executable)
 
+    def test_phase_readiness_follows_status_changes(self, complex_wbs):
+        """フェーズの準備状態がステータスの変更（完了の取り消しを含む）に追従するテスト"""
+        engine = TaskGraphEngine(complex_wbs)
+        
+        for task_id in ["task-001", "task-002", "task-003"]:
+            engine.update_task_status(task_id, TaskStatus.COMPLETED)
+        assert engine._is_phase_ready("phase2")
+        
+        # 完了を取り消すと再び待機になる
+        engine.update_task_status("task-003", TaskStatus.FAILED)
+        assert not engine._is_phase_ready("phase2")
+        assert all(t.id != "task-004" for t in engine.get_executable_tasks())
+        
+        # 同じステータスへの更新で数がずれない
+        engine.update_task_status("task-001", TaskStatus.COMPLETED)
+        engine.update_task_status("task-003", TaskStatus.COMPLETED)
+        assert engine._is_phase_ready("phase2")
+
+    def test_ready_set_matches_full_scan(self):
+        """増分更新した実行可能タスクが、全タスクを走査した結果と一致するテスト"""
+        import random
+        rng = random.Random(0)
+        
+        phases = []
+        task_ids = []
+        for p in range(4):
+            tasks = []
+            for t in range(6):
+                task_id = f"p{p}-t{t}"
+                deps = rng.sample(task_ids, min(len(task_ids), rng.randint(0, 2)))
+                tasks.append({"id": task_id, "name": task_id, "dependencies": deps})
+                task_ids.append(task_id)
+            phase = {"id": f"phase{p}", "tasks": tasks}
+            if p:
+                phase["depends_on_phase"] = f"phase{rng.randrange(p)}"
+            phases.append(phase)
+        engine = TaskGraphEngine({"phases": phases})
+        
+        def full_scan():
+            return [
+                task.id for task in engine.tasks.values()
+                if task.status == TaskStatus.PENDING
+                and all(
+                    other.status == TaskStatus.COMPLETED for other in engine.tasks.values()
+                    if other.phase_id == engine.phase_dependencies.get(task.phase_id)
+                )
+                and all(engine.tasks[d].status == TaskStatus.COMPLETED for d in task.dependencies)
+            ]
+        
+        for _ in range(300):
+            engine.update_task_status(rng.choice(task_ids), rng.choice(list(TaskStatus)))
+            assert [t.id for t in engine.get_executable_tasks()] == full_scan()
+
     def test_circular_dependency_detection(self):
         """循環依存の検出"""
         wbs_data = {
@@ -158,11 +251,61 @@ class TestTaskGraphEngine:
             }]
         }
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(wbs_data, f)
-            
-            with pytest.raises(ValueError, match="Circular dependency"):
-                TaskGraphEngine(f.name)
+        with pytest.raises(ValueError, match="Circular dependency"):
+            TaskGraphEngine(wbs_data)
+
+    def test_circular_dependency_reports_cycle_member(self):
+        """循環の下流のタスクではなく、循環上のタスクが報告されるテスト"""
+        wbs_data = {
+            "phases": [{
+                "id": "phase1",
+                "tasks": [
+                    {"id": "downstream", "name": "D", "dependencies": ["task-a"]},
+                    {"id": "task-a", "name": "A", "dependencies": ["task-b"]},
+                    {"id": "task-b", "name": "B", "dependencies": ["task-a"]}
+                ]
+            }]
+        }
+        with pytest.raises(ValueError, match="involving task task-[ab]"):
+            TaskGraphEngine(wbs_data)
+
+    def test_deep_dependency_chain(self):
+        """再帰上限を超える深さの依存チェーンでも検証できるテスト"""
+        depth = 1500
+        wbs_data = {
+            "phases": [{
+                "id": "phase1",
+                "tasks": [
+                    {
+                        "id": f"task-{i}",
+                        "name": f"Task {i}",
+                        "dependencies": [f"task-{i - 1}"] if i else []
+                    }
+                    for i in range(depth)
+                ]
+            }]
+        }
+        engine = TaskGraphEngine(wbs_data)
+        
+        assert engine._topo_order == [f"task-{i}" for i in range(depth)]
+
+    def test_load_wbs_cache_follows_file_changes(self, tmp_path):
+        """WBSの解析結果は再利用され、ファイルが更新されると読み直されるテスト"""
+        wbs_path = tmp_path / "wbs.yaml"
+        wbs_path.write_text(dump_wbs({"phases": [{"id": "p1", "tasks": [{"id": "a", "name": "A"}]}]}))
+        
+        first = load_wbs(str(wbs_path))
+        assert load_wbs(str(wbs_path)) is first
+        
+        wbs_path.write_text(dump_wbs({"phases": [{"id": "p1", "tasks": [
+            {"id": "a", "name": "A"}, {"id": "b", "name": "B", "dependencies": ["a"]}
+        ]}]}))
+        
+        engine = TaskGraphEngine(str(wbs_path))
+        assert set(engine.tasks) == {"a", "b"}
+        # 共有される解析結果をタスク側から変更しない
+        engine.tasks["b"].dependencies.append("x")
+        assert load_wbs(str(wbs_path))["phases"][0]["tasks"][1]["dependencies"] == ["a"]
 
     def test_get_task_status(self, simple_wbs):
         """タスクステータスの取得"""
@@ -203,4 +346,47 @@ class TestTaskGraphEngine:
         summary = engine.get_progress_summary()
         assert summary["pending"] == 2
         assert summary["in_progress"] == 1
-        assert summary["completed"] == 1
\ No newline at end of file
+        assert summary["completed"] == 1
+
+    def test_progress_summary_counts_follow_transitions(self, complex_wbs):
+        """同じ状態への更新や完了の取り消しでも進捗の集計がずれない"""
+        engine = TaskGraphEngine(complex_wbs)
+        
+        engine.update_task_status("task-001", TaskStatus.COMPLETED)
+        engine.update_task_status("task-001", TaskStatus.COMPLETED)
+        engine.update_task_status("task-002", TaskStatus.FAILED)
+        engine.update_task_status("task-002", TaskStatus.PENDING)
+        engine.update_task_status("task-003", TaskStatus.IN_PROGRESS)
+        
+        summary = engine.get_progress_summary()
+        for status in TaskStatus:
+            expected = sum(1 for task in engine.tasks.values() if task.status == status)
+            assert summary[status.value] == expected
+        assert summary == {"total": 4, "pending": 2, "in_progress": 1, "completed": 1, "failed": 0}
+        assert not engine.is_all_tasks_completed()
+
+    def test_update_task_statuses_matches_sequential_updates(self, complex_wbs):
+        """まとめて更新した結果が1件ずつ更新した結果と一致するテスト"""
+        updates = {
+            "task-001": TaskStatus.COMPLETED,
+            "task-002": TaskStatus.COMPLETED,
+            "task-003": TaskStatus.IN_PROGRESS,
+        }
+        sequential = TaskGraphEngine(complex_wbs)
+        for task_id, status in updates.items():
+            sequential.update_task_status(task_id, status)
+        
+        batched = TaskGraphEngine(complex_wbs)
+        batched.update_task_statuses(updates)
+        
+        assert batched.get_executable_tasks() == sequential.get_executable_tasks()
+        assert batched.get_progress_summary() == sequential.get_progress_summary()
+        
+        # 後続の1件ずつの更新も正しく反映される
+        batched.update_task_status("task-003", TaskStatus.COMPLETED)
+        assert [t.id for t in batched.get_executable_tasks()] == ["task-004"]
+        
+        # 存在しないタスクが含まれる場合は何も更新しない
+        with pytest.raises(ValueError):
+            batched.update_task_statuses({"task-004": TaskStatus.COMPLETED, "missing": TaskStatus.COMPLETED})
+        assert batched.get_task_status("task-004") == TaskStatus.PENDING